@@ -1,25 +1,120 @@
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+import os
 import rasterio
+from rasterio.windows import Window
 import numpy as np
+from metrics import timed, count
+from raster_writer import open_cog
+
+def _windows(width, height, block_size):
+    for row in range(0, height, block_size):
+        for col in range(0, width, block_size):
+            yield Window(col, row, min(block_size, width - col), min(block_size, height - row))
+
+def classify_block(ndvi, threshold):
+    """
+    Classify a (dates, rows, cols) NDVI block into change classes for each
+    consecutive pair of dates. Returns (classes, magnitude, confidence):
+    - classes: uint8, 0: Stable/NoData, 1: Loss (NDVI drop), 2: Gain (NDVI increase)
+    - magnitude: float32 NDVI difference (NaN where either date is NoData)
+    - confidence: uint8 0-100, distance from the decision threshold relative to it
+    """
+    diff = np.subtract(ndvi[1:], ndvi[:-1], dtype=np.float32)
+
+    classes = np.zeros(diff.shape, dtype=np.uint8)
+    classes[diff < -threshold] = 1 # Loss
+    classes[diff > threshold] = 2  # Gain
+
+    # |(|diff| - threshold)| / threshold, clipped to [0, 1]; computed in place
+    confidence = np.abs(diff)
+    confidence -= threshold
+    np.abs(confidence, out=confidence)
+    confidence *= 100.0 / threshold
+    np.clip(confidence, 0, 100, out=confidence)
+    np.nan_to_num(confidence, copy=False, nan=0.0)
+    return classes, diff, confidence.astype(np.uint8)
+
+@timed("baseline")
+def detect_change_blockwise(ndvi_paths, output_path, threshold=0.2, magnitude_path=None,
+                            confidence_path=None, block_size=1024, num_threads=None, tags=None):
+    """
+    Detect change from NDVI composites by streaming blocks of the inputs.
+
+    ndvi_paths: T1/T2 NDVI composites, or a longer (e.g. monthly) stack. The
+    output has one band per consecutive pair of dates. Memory is bounded by
+    block_size and the number of in-flight blocks, and blocks are processed
+    by num_threads workers. Magnitude (float32) and confidence (uint8) bands
+    are written in the same pass when their paths are given, all as COGs,
+    with tags as GeoTIFF metadata.
+    """
+    if len(ndvi_paths) < 2:
+        raise ValueError("At least two NDVI composites are required")
+
+    num_threads = num_threads or os.cpu_count() or 1
+    local = threading.local()
+    handles = []
+    handles_lock = threading.Lock()
+
+    def sources():
+        # Dataset handles are not thread-safe, so every worker opens its own
+        if not hasattr(local, "srcs"):
+            local.srcs = [rasterio.open(p) for p in ndvi_paths]
+            with handles_lock:
+                handles.extend(local.srcs)
+        return local.srcs
+
+    def process(window):
+        ndvi = np.stack([src.read(1, window=window, masked=True).astype(np.float32).filled(np.nan)
+                         for src in sources()])
+        return window, classify_block(ndvi, threshold)
+
+    with rasterio.open(ndvi_paths[0]) as ref:
+        meta = ref.meta.copy()
+        width, height = ref.width, ref.height
+    for path in ndvi_paths[1:]:
+        with rasterio.open(path) as src:
+            if (src.width, src.height) != (width, height):
+                raise ValueError(f"{path} is not aligned with {ndvi_paths[0]}")
+
+    meta.update(count=len(ndvi_paths) - 1)
+    with ExitStack() as stack:
+        outputs = [stack.enter_context(open_cog(output_path, meta, tags=tags, dtype=rasterio.uint8, nodata=None))]
+        if magnitude_path:
+            outputs.append(stack.enter_context(
+                open_cog(magnitude_path, meta, tags=tags, dtype=rasterio.float32, nodata=np.nan)))
+        if confidence_path:
+            outputs.append(stack.enter_context(
+                open_cog(confidence_path, meta, tags=tags, dtype=rasterio.uint8, nodata=None, resampling="average")))
+        stack.callback(lambda: [src.close() for src in handles])
+
+        with ThreadPoolExecutor(max_workers=num_threads) as executor:
+            pending = deque()
+
+            def write_next():
+                window, (classes, magnitude, confidence) = pending.popleft().result()
+                products = [classes]
+                if magnitude_path:
+                    products.append(magnitude)
+                if confidence_path:
+                    products.append(confidence)
+                for dst, data in zip(outputs, products):
+                    dst.write(data, window=window)
+
+            # Keep at most 2 blocks per worker in flight to bound memory
+            for window in _windows(width, height, block_size):
+                pending.append(executor.submit(process, window))
+                if len(pending) >= 2 * num_threads:
+                    write_next()
+            while pending:
+                write_next()
+
+    count(pixels=width * height * len(ndvi_paths), path=output_path)
 
 def detect_change_baseline(t1_ndvi_path, t2_ndvi_path, output_path, threshold=0.2):
     """
     Detect change based on NDVI difference.
     """
-    with rasterio.open(t1_ndvi_path) as src1, rasterio.open(t2_ndvi_path) as src2:
-        ndvi1 = src1.read(1)
-        ndvi2 = src2.read(1)
-        
-        diff = ndvi2 - ndvi1
-        
-        # Classify
-        # 0: Stable, 1: Loss (NDVI drop), 2: Gain (NDVI increase)
-        change_map = np.zeros_like(diff, dtype=np.uint8)
-        
-        change_map[diff < -threshold] = 1 # Loss
-        change_map[diff > threshold] = 2  # Gain
-        
-        meta = src1.meta.copy()
-        meta.update(dtype=rasterio.uint8, count=1)
-        
-        with rasterio.open(output_path, 'w', **meta) as dst:
-            dst.write(change_map, 1)
+    detect_change_blockwise([t1_ndvi_path, t2_ndvi_path], output_path, threshold=threshold)
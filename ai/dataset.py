@@ -3,6 +3,8 @@ from torch.utils.data import Dataset
 import rasterio
 import numpy as np
 import os
+from torch.utils.data import WeightedRandomSampler
+from patch_store import load_index, class_balanced_weights
 
 class ChangeDetectionDataset(Dataset):
     def __init__(self, t1_paths, t2_paths, labels_paths=None, transform=None):
@@ -34,10 +36,70 @@ class ChangeDetectionDataset(Dataset):
 
         if self.labels_paths:
             with rasterio.open(self.labels_paths[idx]) as src:
-                label = src.read(1).astype(np.long)
+                label = src.read(1).astype(np.int64)
             sample['label'] = torch.from_numpy(label)
 
         if self.transform:
             sample = self.transform(sample)
 
         return sample
+
+class PatchStoreDataset(Dataset):
+    """
+    Dataset over a patch store written by patch_store.prepare_patch_store.
+    Samples are zero-copy uint16/uint8 views of the memory-mapped arrays;
+    apply normalize_batch to the collated batch to get float inputs.
+    """
+    def __init__(self, store_dir, transform=None):
+        self.store_dir = store_dir
+        self.transform = transform
+        self.index = load_index(store_dir)
+        self._arrays = None
+
+    def _open(self):
+        # Opened lazily so each DataLoader worker maps the files itself
+        # ('c' = copy-on-write: writable views, file never modified)
+        if self._arrays is None:
+            self._arrays = {
+                name: np.load(os.path.join(self.store_dir, f"{name}.npy"), mmap_mode='c')
+                for name in ("t1", "t2", "labels")
+            }
+        return self._arrays
+
+    def __len__(self):
+        return self.index["count"]
+
+    def __getitem__(self, idx):
+        arrays = self._open()
+        sample = {
+            't1': torch.from_numpy(arrays["t1"][idx]),
+            't2': torch.from_numpy(arrays["t2"][idx]),
+            'label': torch.from_numpy(arrays["labels"][idx]),
+        }
+
+        if self.transform:
+            sample = self.transform(sample)
+
+        return sample
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_arrays"] = None
+        return state
+
+def normalize_batch(batch, scale=10000.0):
+    """
+    Convert a collated PatchStoreDataset batch to model inputs in one vectorized step.
+    """
+    return {
+        't1': batch['t1'].float().div_(scale),
+        't2': batch['t2'].float().div_(scale),
+        'label': batch['label'].long(),
+    }
+
+def balanced_sampler(dataset, num_samples=None):
+    """
+    Random patch sampler (with replacement) weighted towards rare change classes.
+    """
+    weights = torch.from_numpy(class_balanced_weights(dataset.store_dir))
+    return WeightedRandomSampler(weights, num_samples or len(dataset), replacement=True)
@@ -0,0 +1,109 @@
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+import torch
+from remote_cache import ByteCache
+
+DISK_MAX_BYTES = int(os.getenv("FEATURE_CACHE_MAX_BYTES", str(50 * 1024 ** 3)))
+
+class FeatureCache:
+    """
+    Cache of per-date SiameseUNet encoder features keyed by
+    (model_tag, composite_id, tile_id, chip), where chip is the
+    (row_off, col_off, height, width) of the window that was encoded.
+
+    Features live in memory with LRU eviction bounded by max_bytes. With a
+    cache_dir they are also persisted (as float16 by default) so later runs
+    and other workers can skip the encoder for months already seen; the disk
+    store is a ByteCache, LRU-evicted beyond disk_max_bytes.
+    """
+    def __init__(self, max_bytes=2 * 1024 ** 3, cache_dir=None, disk_dtype=torch.float16,
+                 disk_max_bytes=DISK_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.disk_dtype = disk_dtype
+        self._disk = ByteCache(cache_dir, max_bytes=disk_max_bytes) if cache_dir else None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _nbytes(features):
+        return sum(f.numel() * f.element_size() for f in features)
+
+    @staticmethod
+    def _disk_key(key):
+        model_tag, composite_id, tile_id, chip = key
+        return f"features|{model_tag}|{composite_id}|{tile_id or 'full'}|{'_'.join(str(int(v)) for v in chip)}"
+
+    def get(self, key, device=None, memory=True):
+        with self._lock:
+            features = self._entries.get(key)
+            if features is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return features
+
+        path = self._disk.lookup(self._disk_key(key)) if self._disk else None
+        if path is not None:
+            try:
+                stored = torch.load(path, map_location=device or "cpu")
+            except FileNotFoundError: # Evicted by another process in between
+                stored = None
+            if stored is not None:
+                features = tuple(f.float() for f in stored)
+                self.disk_hits += 1
+                if memory:
+                    self._remember(key, features)
+                return features
+
+        self.misses += 1
+        return None
+
+    def put(self, key, features, memory=True, disk=True):
+        """
+        Store features in memory and/or on disk. Callers skip memory for
+        features that cannot be asked for again, and disk for features of
+        weights that are never reloaded (e.g. random initialisation).
+        """
+        features = tuple(features)
+        if memory:
+            self._remember(key, features)
+        if disk and self._disk:
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".pt.tmp")
+            os.close(fd)
+            torch.save(tuple(f.detach().to(self.disk_dtype).cpu() for f in features), tmp_path)
+            self._disk.put(self._disk_key(key), src_path=tmp_path) # Atomic rename, then LRU eviction
+
+    def get_or_compute(self, key, compute, device=None, memory=True, disk=True):
+        features = self.get(key, device, memory=memory)
+        if features is None:
+            features = compute()
+            self.put(key, features, memory=memory, disk=disk)
+        return features
+
+    def _remember(self, key, features):
+        size = self._nbytes(features)
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._nbytes(self._entries.pop(key))
+            self._entries[key] = features
+            self._bytes += size
+            # Evict least recently used, but always keep the newest entry
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= self._nbytes(evicted)
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "disk_bytes": self._disk.stats()["bytes"] if self._disk else 0,
+        }
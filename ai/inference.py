@@ -2,24 +2,45 @@ import torch
 import rasterio
 import numpy as np
 import os
-from model import ChangeNet
+import uuid
+from collections import Counter
+from contextlib import ExitStack
+from rasterio.windows import Window
+from model import ChangeNet, SiameseUNet
+from feature_cache import FeatureCache
+from metrics import timed, count
+from raster_writer import write_cog, open_cog
 
-def run_inference(t1_path, t2_path, output_path, model_path=None):
+MODELS = {"changenet": ChangeNet, "siamese": SiameseUNet}
+
+# Siamese inference runs on chips of CHIP_SIZE pixels (including CHIP_OVERLAP
+# pixels of context on each side), so memory is bounded whatever the raster size
+CHIP_SIZE = int(os.getenv("INFERENCE_CHIP_SIZE", "512"))
+CHIP_OVERLAP = int(os.getenv("INFERENCE_CHIP_OVERLAP", "32"))
+
+def load_model(model_path=None, device=None, arch="changenet"):
     """
-    Run change detection inference on a pair of images.
+    Build the model and load weights once, so it can be reused across tiles.
     """
-    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-    
-    # Load Model
-    model = ChangeNet(in_channels=4, n_classes=4) # 4 classes: Stable, Loss, Gain, Deg
+    device = device or torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+
+    model = MODELS[arch](in_channels=4, n_classes=4) # 4 classes: Stable, Loss, Gain, Deg
     if model_path and os.path.exists(model_path):
         model.load_state_dict(torch.load(model_path, map_location=device))
     else:
         print("Warning: No model weights found, using random initialization for demo.")
-    
+
     model.to(device)
     model.eval()
-    
+    return model
+
+@timed("inference")
+def predict(model, t1_path, t2_path, output_path):
+    """
+    Run a loaded model on a pair of images and write the class map.
+    """
+    device = next(model.parameters()).device
+
     # Read Data
     with rasterio.open(t1_path) as src:
         t1 = src.read().astype(np.float32) / 10000.0
@@ -40,8 +61,132 @@ def run_inference(t1_path, t2_path, output_path, model_path=None):
         
     # Save Result
     meta.update(count=1, dtype=rasterio.uint8)
-    with rasterio.open(output_path, 'w', **meta) as dst:
-        dst.write(preds.astype(rasterio.uint8), 1)
+    write_cog(output_path, preds, meta)
+
+    count(pixels=preds.size, path=output_path)
+
+def run_inference(t1_path, t2_path, output_path, model_path=None):
+    """
+    Run change detection inference on a pair of images.
+    """
+    model = load_model(model_path)
+    predict(model, t1_path, t2_path, output_path)
+
+def run_tile_inference(t1_dir, t2_dir, output_dir, tile_ids, image_name="stack.tif", model_path=None):
+    """
+    Run inference tile by tile on two per-tile composite trees
+    (<dir>/<tile_id>/<image_name>), loading the model only once.
+    Tiles missing either date are skipped; returns {tile_id: output_path}.
+    """
+    model = load_model(model_path)
+    outputs = {}
+    for tile_id in tile_ids:
+        t1_path = os.path.join(t1_dir, tile_id, image_name)
+        t2_path = os.path.join(t2_dir, tile_id, image_name)
+        if not (os.path.exists(t1_path) and os.path.exists(t2_path)):
+            continue
+        os.makedirs(os.path.join(output_dir, tile_id), exist_ok=True)
+        output_path = os.path.join(output_dir, tile_id, "change.tif")
+        if not os.path.exists(output_path):
+            predict(model, t1_path, t2_path, output_path)
+        outputs[tile_id] = output_path
+    return outputs
+
+def model_tag(model_path=None):
+    """
+    Identify the weights features were computed with, so cached features are
+    invalidated when the model is retrained. None for randomly initialised
+    weights, which differ per run: their features are never reusable.
+    """
+    if model_path and os.path.exists(model_path):
+        stat = os.stat(model_path)
+        return f"{os.path.basename(model_path)}-{int(stat.st_mtime)}-{stat.st_size}"
+    return None
+
+def chip_windows(width, height, size=CHIP_SIZE, overlap=CHIP_OVERLAP):
+    """
+    Yield (core, read) windows over a raster. Core windows tile the raster
+    without overlap; each read window adds `overlap` pixels of context on
+    every side (clipped to the raster), so chip borders are not predicted
+    from zero padding.
+    """
+    step = size - 2 * overlap
+    for row in range(0, height, step):
+        for col in range(0, width, step):
+            core = Window(col, row, min(step, width - col), min(step, height - row))
+            top, left = max(0, row - overlap), max(0, col - overlap)
+            bottom, right = min(height, row + step + overlap), min(width, col + step + overlap)
+            yield core, Window(left, top, right - left, bottom - top)
+
+def read_chip(src, window, device):
+    """
+    Read a window as a (1, bands, rows, cols) tensor, edge-padded to a
+    multiple of 8 so the three poolings of the encoder line up with the
+    decoder's upsampling.
+    """
+    image = src.read(window=window).astype(np.float32) / 10000.0
+    pad_rows, pad_cols = -image.shape[1] % 8, -image.shape[2] % 8
+    if pad_rows or pad_cols:
+        image = np.pad(image, ((0, 0), (0, pad_rows), (0, pad_cols)), mode="edge")
+    return torch.from_numpy(image).unsqueeze(0).to(device)
+
+@timed("inference")
+def run_siamese_series(composites, output_dir, tile_id=None, model_path=None, cache=None):
+    """
+    Run Siamese change detection over consecutive dates.
+
+    composites: ordered list of (composite_id, image_path), e.g. monthly
+    composites of one tile, all on the same grid. Each date goes through the
+    encoder once (or is served from the feature cache) and only the decoder
+    runs per pair (M1,M2), (M2,M3), ... Rasters are processed in chips of
+    CHIP_SIZE pixels, so memory does not grow with the raster size. Returns
+    the list of written change maps.
+    """
+    model = load_model(model_path, arch="siamese")
+    device = next(model.parameters()).device
+    cache = cache or FeatureCache()
+    tag = model_tag(model_path)
+    os.makedirs(output_dir, exist_ok=True)
+    if len(composites) < 2:
+        return []
+
+    # Within the run a chip's features are handed on as `previous`, so the
+    # memory cache only helps composites listed more than once
+    repeated = {cid for cid, n in Counter(cid for cid, _ in composites).items() if n > 1}
+    key_tag = tag or f"random-{uuid.uuid4().hex}"  # Random weights: unique to this run
+
+    def features(composite_id, src, window):
+        def encode():
+            with torch.no_grad():
+                return model.forward_one(read_chip(src, window, device))
+        chip = (window.row_off, window.col_off, window.height, window.width)
+        key = (key_tag, composite_id, tile_id, chip)
+        return cache.get_or_compute(key, encode, device, memory=composite_id in repeated, disk=tag is not None)
+
+    pairs = list(zip(composites, composites[1:]))
+    outputs = [os.path.join(output_dir, f"{a[0]}_{b[0]}_change.tif") for a, b in pairs]
+    with ExitStack() as stack:
+        sources = [stack.enter_context(rasterio.open(path)) for _, path in composites]
+        meta = sources[0].meta.copy()
+        meta.update(count=1, dtype=rasterio.uint8)
+        writers = [stack.enter_context(open_cog(path, meta)) for path in outputs]
+
+        for core, window in chip_windows(meta["width"], meta["height"]):
+            rows = slice(core.row_off - window.row_off, core.row_off - window.row_off + core.height)
+            cols = slice(core.col_off - window.col_off, core.col_off - window.col_off + core.width)
+            previous = None
+            for i, ((composite_id, _), src) in enumerate(zip(composites, sources)):
+                current = features(composite_id, src, window)
+                if previous is not None:
+                    with torch.no_grad():
+                        output = model.decode(previous, current)
+                        preds = torch.argmax(output, dim=1).squeeze(0).cpu().numpy()
+                    writers[i - 1].write(preds[rows, cols].astype(np.uint8), 1, window=core)
+                    count(pixels=core.width * core.height)
+                previous = current
+    for path in outputs:
+        count(path=path)
+    return outputs
 
 if __name__ == "__main__":
     # Demo
@@ -45,31 +45,27 @@ class SiameseUNet(nn.Module):
         x4 = self.down3(x3)
         return x1, x2, x3, x4
 
+    def decode(self, f1, f2):
+        """
+        Decode change logits from the encoder features of two dates (as returned
+        by forward_one), so features of a date can be computed once and reused.
+        Input height/width must be divisible by 8.
+        """
+        t1_x1, t1_x2, t1_x3, t1_x4 = f1
+        t2_x1, t2_x2, t2_x3, t2_x4 = f2
+
+        # Concatenate features (Siamese fusion) at the bottleneck and every skip level
+        x = self.up1(torch.cat([t1_x4, t2_x4], dim=1))
+        x = self.conv1(torch.cat([x, t1_x3, t2_x3], dim=1))
+        x = self.up2(x)
+        x = self.conv2(torch.cat([x, t1_x2, t2_x2], dim=1))
+        x = self.up3(x)
+        x = self.conv3(torch.cat([x, t1_x1, t2_x1], dim=1))
+        return self.outc(x)
+
     def forward(self, t1, t2):
-        # Encode both images
-        t1_x1, t1_x2, t1_x3, t1_x4 = self.forward_one(t1)
-        t2_x1, t2_x2, t2_x3, t2_x4 = self.forward_one(t2)
-        
-        # Concatenate features (Siamese fusion)
-        x4 = torch.cat([t1_x4, t2_x4], dim=1)
-        
-        # Decode
-        x = self.up1(x4)
-        # Resize if necessary (omitted for brevity, assuming power of 2 dims)
-        diff3 = torch.cat([t1_x3, t2_x3], dim=1) # Or absolute difference
-        x = torch.cat([x, diff3], dim=1) # Simple concat for now, dimensions need to match
-        # Note: The dimensions here are tricky in a simple concat. 
-        # A proper Siamese U-Net usually concatenates the difference or the features at the bottleneck.
-        # Let's simplify: Concatenate at bottleneck and decode.
-        
-        # Re-implementation for standard U-Net with stacked input (Early Fusion) or Siamese (Late Fusion)
-        # Let's do Early Fusion (Stacked T1+T2) for simplicity and robustness if alignment is perfect.
-        # But requirements said "Siamese". Let's do a proper Difference-based decoder.
-        
-        # Actually, let's stick to a standard U-Net taking 2*channels input. It's often more effective for change detection.
-        # If we MUST do Siamese, we compute difference features.
-        
-        pass 
+        # Encode both images with the shared encoder, then decode the pair
+        return self.decode(self.forward_one(t1), self.forward_one(t2))
 
 class ChangeNet(nn.Module):
     """
@@ -0,0 +1,94 @@
+import json
+import os
+import numpy as np
+import rasterio
+from rasterio.windows import Window
+
+# On-disk patch store for training.
+# T1/T2 images are kept as raw uint16 reflectance and labels as uint8 in .npy
+# arrays that are memory-mapped at training time, so a sample costs a page-cache
+# read instead of decoding three GeoTIFFs.
+
+INDEX_FILE = "index.json"
+
+def _patch_windows(width, height, patch_size, stride):
+    for row in range(0, height - patch_size + 1, stride):
+        for col in range(0, width - patch_size + 1, stride):
+            yield Window(col, row, patch_size, patch_size)
+
+def prepare_patch_store(t1_paths, t2_paths, labels_paths, output_dir, patch_size=256, stride=None, n_classes=4):
+    """
+    Cut aligned T1/T2/label rasters into fixed-size patches (partial edge
+    patches are dropped) and write them to output_dir as t1.npy, t2.npy,
+    labels.npy, class_counts.npy and index.json.
+    """
+    stride = stride or patch_size
+    os.makedirs(output_dir, exist_ok=True)
+
+    # First pass: count patches so the arrays can be preallocated
+    entries = []
+    with rasterio.open(t1_paths[0]) as src:
+        bands = src.count
+    for i, path in enumerate(t1_paths):
+        with rasterio.open(path) as src:
+            if src.count != bands:
+                raise ValueError(f"{path} has {src.count} bands, expected {bands}")
+            for window in _patch_windows(src.width, src.height, patch_size, stride):
+                entries.append((i, int(window.row_off), int(window.col_off)))
+
+    n = len(entries)
+    shape = (n, bands, patch_size, patch_size)
+    t1_store = np.lib.format.open_memmap(os.path.join(output_dir, "t1.npy"), mode='w+', dtype=np.uint16, shape=shape)
+    t2_store = np.lib.format.open_memmap(os.path.join(output_dir, "t2.npy"), mode='w+', dtype=np.uint16, shape=shape)
+    labels_store = np.lib.format.open_memmap(os.path.join(output_dir, "labels.npy"), mode='w+', dtype=np.uint8,
+                                             shape=(n, patch_size, patch_size))
+    class_counts = np.zeros((n, n_classes), dtype=np.int64)
+
+    # Second pass: read each source once, window by window
+    idx = 0
+    for i in range(len(t1_paths)):
+        with rasterio.open(t1_paths[i]) as s1, rasterio.open(t2_paths[i]) as s2, \
+                rasterio.open(labels_paths[i]) as sl:
+            while idx < n and entries[idx][0] == i:
+                _, row, col = entries[idx]
+                window = Window(col, row, patch_size, patch_size)
+                t1_store[idx] = s1.read(window=window)
+                t2_store[idx] = s2.read(window=window)
+                label = sl.read(1, window=window)
+                labels_store[idx] = label
+                class_counts[idx] = np.bincount(label.ravel(), minlength=n_classes)[:n_classes]
+                idx += 1
+
+    for store in (t1_store, t2_store, labels_store):
+        store.flush()
+    np.save(os.path.join(output_dir, "class_counts.npy"), class_counts)
+
+    index = {
+        "patch_size": patch_size,
+        "stride": stride,
+        "bands": bands,
+        "n_classes": n_classes,
+        "count": n,
+        "sources": [{"t1": t1, "t2": t2, "label": lb} for t1, t2, lb in zip(t1_paths, t2_paths, labels_paths)],
+        "patches": entries,
+    }
+    with open(os.path.join(output_dir, INDEX_FILE), 'w') as f:
+        json.dump(index, f)
+    return index
+
+def load_index(store_dir):
+    with open(os.path.join(store_dir, INDEX_FILE)) as f:
+        return json.load(f)
+
+def class_balanced_weights(store_dir):
+    """
+    Per-patch sampling weights that favour patches containing rare classes:
+    weight = sum over classes of (pixel fraction of class in patch / global class frequency).
+    """
+    counts = np.load(os.path.join(store_dir, "class_counts.npy")).astype(np.float64)
+    freq = counts.sum(axis=0)
+    freq = freq / max(freq.sum(), 1)
+    inv = np.where(freq > 0, 1.0 / np.maximum(freq, 1e-12), 0.0)
+    fractions = counts / np.maximum(counts.sum(axis=1, keepdims=True), 1)
+    weights = fractions @ inv
+    return weights / weights.sum()
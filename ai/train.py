@@ -0,0 +1,167 @@
+import argparse
+import os
+import time
+import torch
+import torch.nn as nn
+from torch.utils.data import DataLoader
+from model import ChangeNet
+from dataset import PatchStoreDataset, normalize_batch, balanced_sampler
+
+def bf16_supported():
+    """
+    True if this CPU has native bfloat16 math (AVX512-BF16 or AMX); elsewhere
+    bf16 autocast is emulated and slower than float32.
+    """
+    checks = ("_is_avx512_bf16_supported", "_is_amx_tile_supported")
+    return any(getattr(torch.cpu, name, lambda: False)() for name in checks)
+
+def save_checkpoint(path, model, optimizer, epoch, step, batch=0):
+    # batch: batches of `epoch` already trained, for mid-epoch checkpoints
+    tmp_path = f"{path}.tmp"
+    torch.save({
+        "model": model.state_dict(),
+        "optimizer": optimizer.state_dict(),
+        "epoch": epoch,
+        "step": step,
+        "batch": batch,
+    }, tmp_path)
+    os.replace(tmp_path, path) # Never leave a truncated checkpoint behind
+
+def build_loader(store_dir, batch_size, workers, prefetch_factor, balanced):
+    dataset = PatchStoreDataset(store_dir)
+    kwargs = {}
+    if workers > 0:
+        # Workers stay alive across epochs and keep batches queued ahead of compute
+        kwargs.update(persistent_workers=True, prefetch_factor=prefetch_factor)
+    return DataLoader(
+        dataset,
+        batch_size=batch_size,
+        sampler=balanced_sampler(dataset) if balanced else None,
+        shuffle=not balanced,
+        num_workers=workers,
+        drop_last=True,
+        **kwargs)
+
+def train(store_dir, output_path, epochs=10, batch_size=16, accum_steps=4, lr=1e-3, workers=4,
+          prefetch_factor=4, threads=None, checkpoint_path=None, resume=False, bf16="auto",
+          balanced=True, checkpoint_every=500, log_every=20):
+    """
+    Train ChangeNet on a patch store (see patch_store.prepare_patch_store) on CPU.
+    The effective batch size is batch_size * accum_steps.
+    """
+    from metrics import MetricsRecorder
+
+    if threads:
+        torch.set_num_threads(threads)
+    use_bf16 = bf16_supported() if bf16 == "auto" else bf16 == "on"
+    checkpoint_path = checkpoint_path or f"{output_path}.ckpt"
+
+    loader = build_loader(store_dir, batch_size, workers, prefetch_factor, balanced)
+    model = ChangeNet(in_channels=loader.dataset.index["bands"], n_classes=loader.dataset.index["n_classes"])
+    model = model.to(memory_format=torch.channels_last)
+    optimizer = torch.optim.AdamW(model.parameters(), lr=lr)
+    criterion = nn.CrossEntropyLoss()
+
+    start_epoch, start_batch, step = 0, 0, 0
+    if resume and os.path.exists(checkpoint_path):
+        state = torch.load(checkpoint_path, map_location="cpu")
+        model.load_state_dict(state["model"])
+        optimizer.load_state_dict(state["optimizer"])
+        start_epoch, start_batch, step = state["epoch"], state.get("batch", 0), state["step"]
+        print(f"Resumed from {checkpoint_path} at epoch {start_epoch}, batch {start_batch}, step {step}")
+
+    print(f"Training on {len(loader.dataset)} patches, bf16={use_bf16}, "
+          f"threads={torch.get_num_threads()}, effective batch={batch_size * accum_steps}")
+
+    recorder = MetricsRecorder()
+    model.train()
+    for epoch in range(start_epoch, epochs):
+        optimizer.zero_grad(set_to_none=True)
+        running_loss = 0.0
+        # Batch order is random, so finishing an interrupted epoch means
+        # training only its remaining number of batches
+        first = start_batch if epoch == start_epoch else 0
+        wait_start = time.perf_counter()
+        for i, batch in enumerate(loader, first):
+            if i >= len(loader):
+                break
+            # Time between the end of the last step and the batch arriving is data wait
+            data_time = time.perf_counter() - wait_start
+            compute_start = time.perf_counter()
+
+            batch = normalize_batch(batch)
+            t1 = batch['t1'].contiguous(memory_format=torch.channels_last)
+            t2 = batch['t2'].contiguous(memory_format=torch.channels_last)
+            # The last accumulation group of an epoch may hold fewer batches
+            group = min(accum_steps, len(loader) - i // accum_steps * accum_steps)
+            with torch.autocast("cpu", dtype=torch.bfloat16, enabled=use_bf16):
+                output = model(t1, t2)
+                loss = criterion(output.float(), batch['label']) / group
+            loss.backward()
+
+            if (i + 1) % accum_steps == 0 or i + 1 == len(loader):
+                optimizer.step()
+                optimizer.zero_grad(set_to_none=True)
+                step += 1
+                if step % checkpoint_every == 0:
+                    save_checkpoint(checkpoint_path, model, optimizer, epoch, step, batch=i + 1)
+
+            compute_time = time.perf_counter() - compute_start
+            samples = t1.shape[0]
+            pixels = samples * t1.shape[2] * t1.shape[3]
+            recorder.record("train_data", data_time)
+            recorder.record("train_compute", compute_time, pixels=pixels)
+            running_loss += loss.item() * group
+
+            if (i + 1) % log_every == 0:
+                total = data_time + compute_time
+                print(f"epoch {epoch} batch {i + 1}/{len(loader)} loss {running_loss / (i + 1 - first):.4f} "
+                      f"step {total * 1000:.0f} ms (data {data_time * 1000:.0f} ms, "
+                      f"compute {compute_time * 1000:.0f} ms) {samples / total:.1f} samples/s")
+            wait_start = time.perf_counter()
+
+        save_checkpoint(checkpoint_path, model, optimizer, epoch + 1, step)
+        stages = recorder.snapshot()["stages"]
+        data_s = stages.get("train_data", {}).get("seconds", 0.0)
+        compute_s = stages.get("train_compute", {}).get("seconds", 0.0)
+        print(f"epoch {epoch} done: loss {running_loss / max(len(loader) - first, 1):.4f}, "
+              f"data wait {data_s:.1f} s vs compute {compute_s:.1f} s so far")
+
+    # Plain state dict, loadable by inference.load_model
+    model = model.to(memory_format=torch.contiguous_format)
+    torch.save(model.state_dict(), output_path)
+    print(f"Saved model to {output_path}")
+    return output_path
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train ChangeNet on CPU from a patch store")
+    parser.add_argument("store", help="Patch store directory (patch_store.prepare_patch_store)")
+    parser.add_argument("output", help="Where to write the trained weights")
+    parser.add_argument("--epochs", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--accum-steps", type=int, default=4, help="Gradient accumulation steps")
+    parser.add_argument("--lr", type=float, default=1e-3)
+    parser.add_argument("--workers", type=int, default=4, help="DataLoader worker processes")
+    parser.add_argument("--prefetch-factor", type=int, default=4, help="Batches queued per worker")
+    parser.add_argument("--threads", type=int, default=None, help="Intra-op compute threads")
+    parser.add_argument("--checkpoint", default=None, help="Checkpoint path (default: <output>.ckpt)")
+    parser.add_argument("--resume", action="store_true")
+    parser.add_argument("--bf16", choices=("auto", "on", "off"), default="auto")
+    parser.add_argument("--no-balance", action="store_true", help="Plain shuffling instead of class-balanced sampling")
+    parser.add_argument("--checkpoint-every", type=int, default=500, help="Optimizer steps between checkpoints")
+    parser.add_argument("--log-every", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    train(args.store, args.output, epochs=args.epochs, batch_size=args.batch_size, accum_steps=args.accum_steps,
+          lr=args.lr, workers=args.workers, prefetch_factor=args.prefetch_factor, threads=args.threads,
+          checkpoint_path=args.checkpoint, resume=args.resume, bf16=args.bf16, balanced=not args.no_balance,
+          checkpoint_every=args.checkpoint_every, log_every=args.log_every)
+
+if __name__ == "__main__":
+    # Run through the geogis entry point, which sets up the import paths
+    import sys
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from geogis import main as geogis_main
+
+    sys.exit(geogis_main(["train", *sys.argv[1:]]))
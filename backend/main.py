@@ -1,14 +1,18 @@
-from fastapi import FastAPI, BackgroundTasks, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Request, Response
+from fastapi.responses import PlainTextResponse
 from fastapi.staticfiles import StaticFiles
-from sqlalchemy import create_engine, Column, Integer, String, Date, Float
+from sqlalchemy import create_engine, func, Column, Integer, String, Date, Float, DateTime, JSON
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
 # from geoalchemy2 import Geometry
+import hashlib
+import json
 import os
-import subprocess
+import threading
+from collections import OrderedDict
 from typing import List, Optional
 from pydantic import BaseModel
-from datetime import date
+from datetime import date, datetime, timedelta
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -23,6 +27,8 @@ elif os.path.exists("backend/frontend"):
 
 # Use DATABASE_URL from .env (Supabase Connection String)
 DATABASE_URL = os.getenv("DATABASE_URL")
+METRICS_WINDOW_HOURS = float(os.getenv("METRICS_WINDOW_HOURS", "24"))
+STATS_CACHE_ENTRIES = int(os.getenv("STATS_CACHE_ENTRIES", "256"))
 
 engine = None
 SessionLocal = None
@@ -46,6 +52,38 @@ class Scene(Base):
     acquisition_date = Column(Date)
     cloud_cover = Column(Float)
 
+class Job(Base):
+    __tablename__ = "jobs"
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String)
+    params = Column(JSON)
+    status = Column(String, default="queued")
+    stage = Column(String)
+    progress = Column(Float, default=0.0)
+    metrics = Column(JSON)
+    error = Column(String)
+    created_at = Column(DateTime)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+class AdminBoundary(Base):
+    __tablename__ = "admin_boundaries"
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String)
+    level = Column(Integer)
+    parent_id = Column(Integer)
+
+class ChangeStat(Base):
+    __tablename__ = "change_stats"
+    id = Column(Integer, primary_key=True)
+    month = Column(Date)
+    sensor = Column(String)
+    admin_id = Column(Integer)
+    change_type = Column(String)
+    area_ha = Column(Float)
+    count = Column(Integer)
+    updated_at = Column(DateTime)
+
 # Schemas
 class IngestRequest(BaseModel):
     bbox: List[float]
@@ -68,27 +106,168 @@ def get_db():
     finally:
         db.close()
 
-# Background Tasks
-def run_ingestion(bbox, start_date, end_date, sensor):
-    # In a real app, import the function. Here we call the script.
-    # We need to pass args to the script, but the script currently has hardcoded args in __main__
-    # For this demo, we'll just print.
-    print(f"Starting ingestion for {sensor} from {start_date} to {end_date}")
-    # subprocess.run(["python", "processing/ingest_s2.py", ...])
-
-def run_pipeline(year, month, sensor):
-    print(f"Starting pipeline for {sensor} {year}-{month}")
-    # subprocess.run(["python", "processing/pipeline.py", ...])
+# Jobs are queued in the database and executed by the processing worker,
+# which reports stage, progress and metrics back into the same row.
+def enqueue_job(db: Session, kind: str, params: dict):
+    job = Job(kind=kind, params=params, status="queued", progress=0.0, created_at=datetime.utcnow())
+    db.add(job)
+    db.commit()
+    return job.id
 
 @app.post("/jobs/ingest")
-def trigger_ingest(request: IngestRequest, background_tasks: BackgroundTasks):
-    background_tasks.add_task(run_ingestion, request.bbox, request.start_date, request.end_date, request.sensor)
-    return {"message": "Ingestion job started"}
+def trigger_ingest(request: IngestRequest, db: Session = Depends(get_db)):
+    job_id = enqueue_job(db, "ingest", {
+        "bbox": request.bbox,
+        "start_date": request.start_date.isoformat(),
+        "end_date": request.end_date.isoformat(),
+        "sensor": request.sensor,
+    })
+    return {"message": "Ingestion job started", "job_id": job_id}
 
 @app.post("/jobs/process")
-def trigger_process(request: ProcessRequest, background_tasks: BackgroundTasks):
-    background_tasks.add_task(run_pipeline, request.year, request.month, request.sensor)
-    return {"message": "Processing job started"}
+def trigger_process(request: ProcessRequest, db: Session = Depends(get_db)):
+    job_id = enqueue_job(db, "process", {"year": request.year, "month": request.month, "sensor": request.sensor})
+    return {"message": "Processing job started", "job_id": job_id}
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: int, db: Session = Depends(get_db)):
+    job = db.get(Job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "params": job.params,
+        "status": job.status,
+        "stage": job.stage,
+        "progress": job.progress,
+        "metrics": job.metrics,
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics(db: Session = Depends(get_db)):
+    """
+    Prometheus text exposition of job counts, progress and per-stage totals.
+    Stage totals cover running jobs and jobs finished in the last
+    METRICS_WINDOW_HOURS, so the scrape cost does not grow with job history.
+    """
+    since = datetime.utcnow() - timedelta(hours=METRICS_WINDOW_HOURS)
+    status_counts = db.query(Job.status, func.count(Job.id)).group_by(Job.status).all()
+    jobs = db.query(Job.id, Job.status, Job.progress, Job.metrics) \
+        .filter((Job.status == "running") | (Job.finished_at >= since)).all()
+
+    stages = {}
+    for job in jobs:
+        for stage, stats in ((job.metrics or {}).get("stages") or {}).items():
+            totals = stages.setdefault(stage, {"seconds": 0.0, "calls": 0, "bytes": 0, "pixels": 0, "peak_rss": 0})
+            for key in ("seconds", "calls", "bytes", "pixels"):
+                totals[key] += stats.get(key, 0)
+            totals["peak_rss"] = max(totals["peak_rss"], stats.get("peak_rss", 0))
+    lines = ["# HELP geogis_jobs Jobs by status", "# TYPE geogis_jobs gauge"]
+    lines += [f'geogis_jobs{{status="{status}"}} {n}' for status, n in sorted(status_counts, key=lambda r: str(r[0]))]
+
+    lines += ["# HELP geogis_job_progress Progress of running jobs (0-1)", "# TYPE geogis_job_progress gauge"]
+    lines += [f'geogis_job_progress{{job_id="{job.id}"}} {job.progress or 0}' for job in jobs if job.status == "running"]
+
+    # Totals over a sliding window can decrease, so they are gauges (without the counter _total suffix)
+    for name, key, kind in (
+        ("stage_seconds", "seconds", "gauge"),
+        ("stage_calls", "calls", "gauge"),
+        ("stage_bytes", "bytes", "gauge"),
+        ("stage_pixels", "pixels", "gauge"),
+        ("stage_peak_rss_bytes", "peak_rss", "gauge"),
+    ):
+        lines.append(f"# TYPE geogis_{name} {kind}")
+        lines += [f'geogis_{name}{{stage="{stage}"}} {totals[key]}' for stage, totals in sorted(stages.items())]
+
+    return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
+
+# /stats responses, valid while the change_stats rollup is unchanged. Keys come
+# from query parameters, so only the STATS_CACHE_ENTRIES most recent are kept.
+stats_cache = {"version": None, "entries": OrderedDict()}
+stats_cache_lock = threading.Lock()
+
+def parse_month(value: Optional[str]):
+    if value is None:
+        return None
+    try:
+        return datetime.strptime(value, "%Y-%m").date()
+    except ValueError:
+        raise HTTPException(status_code=422, detail=f"Invalid month {value!r}, expected YYYY-MM")
+
+def build_stats(db: Session, admin_id, parent_id, level, sensor, start, end):
+    admins = db.query(AdminBoundary.id, AdminBoundary.name)
+    if admin_id is not None:
+        admins = admins.filter(AdminBoundary.id == admin_id)
+    elif parent_id is not None:
+        admins = admins.filter(AdminBoundary.parent_id == parent_id)
+    else:
+        admins = admins.filter(AdminBoundary.level == level)
+    names = dict(admins.all())
+
+    rows = db.query(ChangeStat).filter(ChangeStat.admin_id.in_(list(names)), ChangeStat.sensor == sensor)
+    if start:
+        rows = rows.filter(ChangeStat.month >= start)
+    if end:
+        rows = rows.filter(ChangeStat.month <= end)
+    rows = rows.order_by(ChangeStat.month).all()
+
+    months = sorted({row.month.strftime("%Y-%m") for row in rows})
+    position = {month: i for i, month in enumerate(months)}
+    series = {}
+    for row in rows:
+        entry = series.setdefault((row.admin_id, row.change_type), {
+            "admin_id": row.admin_id,
+            "name": names[row.admin_id],
+            "change_type": row.change_type,
+            "area_ha": [0.0] * len(months),
+            "count": [0] * len(months),
+        })
+        i = position[row.month.strftime("%Y-%m")]
+        entry["area_ha"][i] = round(row.area_ha or 0.0, 2)
+        entry["count"][i] = row.count or 0
+    return {"sensor": sensor, "months": months, "series": [series[k] for k in sorted(series)]}
+
+@app.get("/stats")
+def change_stats(request: Request, admin_id: Optional[int] = None, parent_id: Optional[int] = None,
+                 level: int = 0, sensor: str = "Sentinel-2", start: Optional[str] = None,
+                 end: Optional[str] = None, db: Session = Depends(get_db)):
+    """
+    Monthly change area per admin boundary and change type, served from the
+    precomputed change_stats rollup. Selects one boundary (admin_id), the
+    children of one (parent_id) or a whole level (default: countries).
+    """
+    start, end = parse_month(start), parse_month(end)
+    # A refresh rewrites rows (new updated_at) or deletes them (lower count)
+    version = tuple(db.query(func.count(ChangeStat.id), func.max(ChangeStat.updated_at)).one())
+    key = (admin_id, parent_id, level, sensor, start, end)
+    with stats_cache_lock:
+        if stats_cache["version"] != version:
+            stats_cache.update(version=version, entries=OrderedDict())
+        entries = stats_cache["entries"]
+        entry = entries.get(key)
+        if entry is not None:
+            entries.move_to_end(key)
+    if entry is None:
+        payload = json.dumps(build_stats(db, admin_id, parent_id, level, sensor, start, end), separators=(",", ":"))
+        etag = f'"{hashlib.sha1(payload.encode()).hexdigest()}"'
+        entry = (etag, payload)
+        with stats_cache_lock:
+            # Not stored if the rollup was refreshed while building
+            if stats_cache["entries"] is entries:
+                entries[key] = entry
+                while len(entries) > STATS_CACHE_ENTRIES:
+                    entries.popitem(last=False)
+
+    etag, payload = entry
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(payload, media_type="application/json", headers=headers)
 
 @app.get("/scenes", response_model=List[dict])
 def list_scenes(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
@@ -0,0 +1,284 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Publishing of pipeline outputs to object storage.
+# A publish run uploads many files concurrently (bounded by max_workers), skips
+# objects whose content hash is already recorded in the local manifest and
+# still present remotely, and uploads large files in resumable parts where the
+# backend supports it.
+
+PART_SIZE = 16 * 1024 * 1024  # 16 MiB multipart chunks
+HASH_CHUNK = 4 * 1024 * 1024
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class Manifest:
+    """
+    Local JSON record of what has been published: {key: {sha256, size, url}}
+    plus in-progress multipart uploads so they can be resumed.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.data = {"objects": {}, "pending": {}}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.data = json.load(f)
+
+    def get(self, key):
+        return self.data["objects"].get(key)
+
+    def record(self, key, sha256, size, url):
+        with self._lock:
+            self.data["objects"][key] = {"sha256": sha256, "size": size, "url": url}
+            self.data["pending"].pop(key, None)
+            self._save()
+
+    def pending(self, key):
+        return self.data["pending"].get(key)
+
+    def set_pending(self, key, state):
+        with self._lock:
+            self.data["pending"][key] = state
+            self._save()
+
+    def _save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.data, f, indent=1)
+        os.replace(tmp_path, self.path)
+
+class StorageBackend:
+    """
+    Minimal interface a publishing target implements.
+    upload() receives the manifest so multipart backends can store resume state.
+    """
+    def exists(self, key):
+        raise NotImplementedError
+
+    def upload(self, key, file_path, manifest=None, sha256=None):
+        raise NotImplementedError
+
+    def public_url(self, key):
+        raise NotImplementedError
+
+class LocalBackend(StorageBackend):
+    """
+    Publishes into a local directory (tests, or a directory served by a web server).
+    """
+    def __init__(self, root, base_url=None):
+        self.root = root
+        self.base_url = base_url
+
+    def _path(self, key):
+        return os.path.join(self.root, key)
+
+    def exists(self, key):
+        return os.path.exists(self._path(key))
+
+    def upload(self, key, file_path, manifest=None, sha256=None):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.part"
+        shutil.copyfile(file_path, tmp_path)
+        os.replace(tmp_path, path)
+
+    def public_url(self, key):
+        if self.base_url:
+            return f"{self.base_url.rstrip('/')}/{key}"
+        return f"file://{os.path.abspath(self._path(key))}"
+
+class S3Backend(StorageBackend):
+    """
+    S3-compatible storage (AWS, MinIO, or Supabase Storage's S3 endpoint).
+    Files larger than part_size use resumable multipart uploads.
+    """
+    def __init__(self, bucket, endpoint_url=None, public_base_url=None, part_size=PART_SIZE, **client_kwargs):
+        import boto3
+
+        self.bucket = bucket
+        self.endpoint_url = endpoint_url
+        self.public_base_url = public_base_url
+        self.part_size = part_size
+        self.client = boto3.client("s3", endpoint_url=endpoint_url, **client_kwargs)
+
+    def exists(self, key):
+        from botocore.exceptions import ClientError
+
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+            return True
+        except ClientError as e:
+            # Only a missing object means "upload it"; auth/throttling errors must surface
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    def upload(self, key, file_path, manifest=None, sha256=None):
+        size = os.path.getsize(file_path)
+        if size <= self.part_size:
+            with open(file_path, 'rb') as f:
+                self.client.put_object(Bucket=self.bucket, Key=key, Body=f)
+            return
+        self._upload_multipart(key, file_path, size, manifest, sha256)
+
+    def _upload_multipart(self, key, file_path, size, manifest, sha256):
+        # Resume a previous upload of the same content if one is pending
+        state = manifest.pending(key) if manifest else None
+        done = {}
+        upload_id = state["upload_id"] if state else None
+        if upload_id and state.get("sha256") == sha256:
+            try:
+                parts = self.client.list_parts(Bucket=self.bucket, Key=key, UploadId=upload_id).get("Parts", [])
+                done = {p["PartNumber"]: p["ETag"] for p in parts}
+            except Exception:
+                self._abort(key, upload_id)
+                upload_id = None
+        elif upload_id:
+            # The file changed since: its parts would otherwise be stored (and billed) until expiry
+            self._abort(key, upload_id)
+            upload_id = None
+
+        if not upload_id:
+            upload_id = self.client.create_multipart_upload(Bucket=self.bucket, Key=key)["UploadId"]
+            if manifest:
+                manifest.set_pending(key, {"upload_id": upload_id, "sha256": sha256})
+
+        n_parts = (size + self.part_size - 1) // self.part_size
+        with open(file_path, 'rb') as f:
+            for number in range(1, n_parts + 1):
+                if number in done:
+                    continue
+                f.seek((number - 1) * self.part_size)
+                response = self.client.upload_part(
+                    Bucket=self.bucket, Key=key, UploadId=upload_id,
+                    PartNumber=number, Body=f.read(self.part_size))
+                done[number] = response["ETag"]
+
+        self.client.complete_multipart_upload(
+            Bucket=self.bucket, Key=key, UploadId=upload_id,
+            MultipartUpload={"Parts": [{"PartNumber": n, "ETag": done[n]} for n in sorted(done)]})
+
+    def _abort(self, key, upload_id):
+        try:
+            self.client.abort_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id)
+        except Exception:
+            pass  # Already completed, aborted or expired
+
+    def public_url(self, key):
+        base = self.public_base_url or f"{(self.endpoint_url or 'https://s3.amazonaws.com').rstrip('/')}/{self.bucket}"
+        return f"{base.rstrip('/')}/{key}"
+
+class SupabaseBackend(StorageBackend):
+    """
+    Supabase Storage through the REST client (single-request uploads).
+    For large COGs prefer S3Backend pointed at the project's S3 endpoint.
+    """
+    def __init__(self, bucket, storage=None):
+        if storage is None:
+            from supabase_storage import storage
+        self.bucket = bucket
+        self.storage = storage
+
+    def _bucket(self):
+        if not self.storage.client:
+            raise RuntimeError("Supabase client not initialized. Check ENV variables.")
+        return self.storage.client.storage.from_(self.bucket)
+
+    def exists(self, key):
+        folder, name = os.path.split(key)
+        entries = self._bucket().list(folder, {"search": name})
+        return any(entry.get("name") == name for entry in entries)
+
+    def upload(self, key, file_path, manifest=None, sha256=None):
+        bucket = self._bucket()
+        with open(file_path, 'rb') as f:
+            bucket.upload(key, f, {"upsert": "true"})
+
+    def public_url(self, key):
+        return self.storage.get_url(self.bucket, key)
+
+def backend_from_env():
+    """
+    Build the backend selected by PUBLISH_BACKEND (local, s3 or supabase).
+    """
+    kind = os.getenv("PUBLISH_BACKEND", "supabase")
+    bucket = os.getenv("PUBLISH_BUCKET", "rasters")
+    if kind == "local":
+        return LocalBackend(os.getenv("PUBLISH_DIR", "published"), os.getenv("PUBLISH_BASE_URL"))
+    if kind == "s3":
+        return S3Backend(bucket, endpoint_url=os.getenv("S3_ENDPOINT_URL"),
+                         public_base_url=os.getenv("PUBLISH_BASE_URL"))
+    if kind == "supabase":
+        return SupabaseBackend(bucket)
+    raise ValueError(f"Unknown PUBLISH_BACKEND: {kind}")
+
+class Publisher:
+    def __init__(self, backend, manifest_path, max_workers=8, retries=3):
+        self.backend = backend
+        self.manifest = Manifest(manifest_path)
+        self.max_workers = max_workers
+        self.retries = retries
+
+    def _publish_one(self, key, file_path):
+        sha256 = file_sha256(file_path)
+        known = self.manifest.get(key)
+        if known and known["sha256"] == sha256 and self.backend.exists(key):
+            return known["url"], False
+
+        for attempt in range(1, self.retries + 1):
+            try:
+                self.backend.upload(key, file_path, manifest=self.manifest, sha256=sha256)
+                break
+            except Exception:
+                if attempt == self.retries:
+                    raise
+                time.sleep(2 ** attempt)
+
+        url = self.backend.public_url(key)
+        self.manifest.record(key, sha256, os.path.getsize(file_path), url)
+        return url, True
+
+    def publish(self, files):
+        """
+        Upload {key: local_path} concurrently. Returns (urls, report) where urls
+        maps every successfully published key to its public URL.
+        """
+        urls = {}
+        report = {"uploaded": [], "skipped": [], "failed": {}}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self._publish_one, key, path): key for key, path in files.items()}
+            for future in as_completed(futures):
+                key = futures[future]
+                try:
+                    url, uploaded = future.result()
+                except Exception as e:
+                    report["failed"][key] = str(e)
+                    continue
+                urls[key] = url
+                report["uploaded" if uploaded else "skipped"].append(key)
+        return urls, report
+
+    def publish_dir(self, local_dir, prefix="", extensions=(".tif", ".vrt", ".gpkg")):
+        """
+        Publish every matching file under local_dir, keyed by prefix + relative path.
+        """
+        files = {}
+        for root, _, names in os.walk(local_dir):
+            for name in names:
+                if name.endswith(extensions):
+                    path = os.path.join(root, name)
+                    rel = os.path.relpath(path, local_dir).replace(os.sep, "/")
+                    files[f"{prefix.rstrip('/')}/{rel}" if prefix else rel] = path
+        return self.publish(files)
@@ -1,19 +1,29 @@
 import os
-from supabase import create_client, Client
+import threading
 from dotenv import load_dotenv
 
-load_dotenv()
-
 class SupabaseStorage:
     def __init__(self):
-        url = os.environ.get("SUPABASE_URL")
-        key = os.environ.get("SUPABASE_KEY")
-        if url and key:
-            self.client: Client = create_client(url, key)
-        else:
-            self.client = None
+        self._client = None
+        self._initialized = False
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        # Created on first use so importing this module stays cheap
+        with self._lock:
+            if not self._initialized:
+                load_dotenv()
+                url = os.environ.get("SUPABASE_URL")
+                key = os.environ.get("SUPABASE_KEY")
+                if url and key:
+                    from supabase import create_client
+
+                    self._client = create_client(url, key)
+                self._initialized = True
+        return self._client
 
-    def upload_raster(self, bucket: str, path: str, file_path: str):
+    def upload_raster(self, bucket: str, path: str, file_path: str, upsert: bool = False):
         """
         Uploads a file to Supabase Storage.
         """
@@ -22,7 +32,8 @@ class SupabaseStorage:
             return None
             
         with open(file_path, 'rb') as f:
-            self.client.storage.from_(bucket).upload(path, f)
+            file_options = {"upsert": "true"} if upsert else None
+            self.client.storage.from_(bucket).upload(path, f, file_options)
             
         return self.client.storage.from_(bucket).get_public_url(path)
 
@@ -0,0 +1,267 @@
+import argparse
+import gc
+import json
+import multiprocessing as mp
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, d) for d in ("processing", "ai", "database")]
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic import generate_dataset
+from metrics import peak_rss_bytes, reset_peak_rss
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# Each case takes (data, out_dir), does any untimed setup and returns
+# (fn, pixels[, samples]): fn() is the timed call, pixels the number of input
+# pixels it processes and samples (dataset cases) the number of training samples.
+
+def case_reproject_resample(data, out_dir):
+    from preprocess import reproject_resample
+    src = data["scenes"]["red"][0]
+    size = data["params"]["size"]
+    return lambda: reproject_resample(src, os.path.join(out_dir, "reprojected.tif")), size * size
+
+def case_create_median_composite(data, out_dir):
+    from preprocess import create_median_composite
+    paths = data["scenes"]["red"]
+    size = data["params"]["size"]
+    return lambda: create_median_composite(paths, os.path.join(out_dir, "composite.tif")), len(paths) * size * size
+
+def case_calculate_ndvi(data, out_dir):
+    from preprocess import calculate_ndvi
+    red, nir = data["scenes"]["red"][0], data["scenes"]["nir"][0]
+    size = data["params"]["size"]
+    return lambda: calculate_ndvi(red, nir, os.path.join(out_dir, "ndvi.tif")), size * size
+
+def case_detect_change_baseline(data, out_dir):
+    from baseline import detect_change_baseline
+    size = data["params"]["size"]
+    return lambda: detect_change_baseline(data["t1_ndvi"], data["t2_ndvi"], os.path.join(out_dir, "baseline.tif")), size * size
+
+def case_detect_change_blockwise(data, out_dir):
+    from baseline import detect_change_blockwise
+    size = data["params"]["size"]
+    return lambda: detect_change_blockwise(
+        [data["t1_ndvi"], data["t2_ndvi"]], os.path.join(out_dir, "blockwise.tif"),
+        magnitude_path=os.path.join(out_dir, "magnitude.tif"),
+        confidence_path=os.path.join(out_dir, "confidence.tif")), size * size
+
+def case_run_inference(data, out_dir):
+    from inference import run_inference
+    size = data["params"]["size"]
+    return lambda: run_inference(data["t1_stack"], data["t2_stack"], os.path.join(out_dir, "inference.tif")), size * size
+
+def case_vectorize_change(data, out_dir):
+    from postprocess import vectorize_change
+    size = data["params"]["size"]
+    return lambda: vectorize_change(data["change"], os.path.join(out_dir, "change.gpkg")), size * size
+
+def case_zonal_statistics(data, out_dir):
+    import geopandas as gpd
+    import rasterio
+    from shapely.geometry import box
+    from postprocess import vectorize_change, calculate_area, zonal_statistics
+
+    changes = calculate_area(vectorize_change(data["change"], os.path.join(out_dir, "zonal_change.gpkg")))
+    with rasterio.open(data["change"]) as src:
+        left, bottom, right, top = src.bounds
+        crs = src.crs
+    # 4x4 grid of synthetic admin units
+    step_x, step_y = (right - left) / 4, (top - bottom) / 4
+    admins = gpd.GeoDataFrame(
+        {"admin_id": list(range(16))},
+        geometry=[box(left + i * step_x, bottom + j * step_y, left + (i + 1) * step_x, bottom + (j + 1) * step_y)
+                  for j in range(4) for i in range(4)],
+        crs=crs)
+    size = data["params"]["size"]
+    return lambda: zonal_statistics(changes, admins), size * size
+
+PATCH_SIZE = 128
+
+def _iterate(dataset, collate=None):
+    from torch.utils.data import DataLoader
+    for batch in DataLoader(dataset, batch_size=16, shuffle=True, num_workers=0):
+        if collate:
+            collate(batch)
+
+def case_dataset_geotiff(data, out_dir):
+    import rasterio
+    from rasterio.windows import Window
+    from dataset import ChangeDetectionDataset
+
+    # One small GeoTIFF per sample, as ChangeDetectionDataset expects
+    paths = {"t1": [], "t2": [], "label": []}
+    size = data["params"]["size"]
+    for name, key in (("t1", "t1_stack"), ("t2", "t2_stack"), ("label", "change")):
+        with rasterio.open(data[key]) as src:
+            for row in range(0, size - PATCH_SIZE + 1, PATCH_SIZE):
+                for col in range(0, size - PATCH_SIZE + 1, PATCH_SIZE):
+                    window = Window(col, row, PATCH_SIZE, PATCH_SIZE)
+                    meta = src.meta.copy()
+                    meta.update(width=PATCH_SIZE, height=PATCH_SIZE, transform=src.window_transform(window))
+                    path = os.path.join(out_dir, f"{name}_{row}_{col}.tif")
+                    with rasterio.open(path, 'w', **meta) as dst:
+                        dst.write(src.read(window=window))
+                    paths[name].append(path)
+    dataset = ChangeDetectionDataset(paths["t1"], paths["t2"], paths["label"])
+    return lambda: _iterate(dataset), len(dataset) * PATCH_SIZE ** 2, len(dataset)
+
+def case_dataset_patch_store(data, out_dir):
+    from patch_store import prepare_patch_store
+    from dataset import PatchStoreDataset, normalize_batch
+
+    store_dir = os.path.join(out_dir, "patches")
+    prepare_patch_store([data["t1_stack"]], [data["t2_stack"]], [data["change"]], store_dir, patch_size=PATCH_SIZE)
+    dataset = PatchStoreDataset(store_dir)
+    return lambda: _iterate(dataset, normalize_batch), len(dataset) * PATCH_SIZE ** 2, len(dataset)
+
+CASES = {
+    "reproject_resample": case_reproject_resample,
+    "create_median_composite": case_create_median_composite,
+    "calculate_ndvi": case_calculate_ndvi,
+    "detect_change_baseline": case_detect_change_baseline,
+    "detect_change_blockwise": case_detect_change_blockwise,
+    "run_inference": case_run_inference,
+    "vectorize_change": case_vectorize_change,
+    "zonal_statistics": case_zonal_statistics,
+    "dataset_geotiff": case_dataset_geotiff,
+    "dataset_patch_store": case_dataset_patch_store,
+}
+
+def _run_case(name, data, repeat, queue):
+    # Runs in a fresh process so peak RSS belongs to this case only
+    out_dir = tempfile.mkdtemp(prefix=f"bench_{name}_")
+    try:
+        fn, pixels, *samples = CASES[name](data, out_dir)
+        # Measure the timed function only, not the setup (inputs, imports) above
+        gc.collect()
+        reset_peak_rss()
+        base_rss = peak_rss_bytes()
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - start)
+        best = min(times)
+        result = {
+            "wall_s": best,
+            "wall_s_all": times,
+            "mpix_per_s": pixels / best / 1e6 if best else 0.0,
+            "pixels": pixels,
+            "peak_rss_mb": peak_rss_bytes() / 2 ** 20,
+            "base_rss_mb": base_rss / 2 ** 20,
+        }
+        if samples:
+            result["samples_per_s"] = samples[0] / best if best else 0.0
+        queue.put(result)
+    except Exception as e:
+        queue.put({"error": f"{type(e).__name__}: {e}"})
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+def run_benchmarks(cases, data, repeat=3):
+    ctx = mp.get_context("spawn")
+    results = {}
+    for name in cases:
+        queue = ctx.Queue()
+        proc = ctx.Process(target=_run_case, args=(name, data, repeat, queue))
+        proc.start()
+        proc.join()
+        results[name] = queue.get() if not queue.empty() else {"error": f"exit code {proc.exitcode}"}
+        r = results[name]
+        if "error" in r:
+            print(f"{name:<26} ERROR {r['error']}")
+        else:
+            extra = f" {r['samples_per_s']:9.1f} samples/s" if "samples_per_s" in r else ""
+            print(f"{name:<26} {r['wall_s']:8.3f} s {r['mpix_per_s']:9.2f} Mpix/s {r['peak_rss_mb']:9.1f} MB "
+                  f"(+{r['peak_rss_mb'] - r['base_rss_mb']:.1f}){extra}")
+    return results
+
+def compare(results, baseline, threshold, skipped=()):
+    """
+    Return the cases that failed against the baseline: wall time regressed by
+    more than `threshold` (fraction), the case errored, or a baseline case is
+    missing from the run. Cases in `skipped` (deselected with --cases) are
+    not reported as missing.
+    """
+    failures = []
+    for name, r in results.items():
+        if "error" in r:
+            print(f"{name:<26} FAILED {r['error']}")
+            failures.append(name)
+            continue
+        base = baseline.get("results", {}).get(name)
+        if not base or "wall_s" not in base:
+            continue
+        change = r["wall_s"] / base["wall_s"] - 1
+        flag = "REGRESSION" if change > threshold else ""
+        print(f"{name:<26} {base['wall_s']:8.3f} s -> {r['wall_s']:8.3f} s ({change:+.1%}) {flag}")
+        if change > threshold:
+            failures.append(name)
+    for name in baseline.get("results", {}):
+        if name not in results and name not in skipped:
+            print(f"{name:<26} MISSING from this run")
+            failures.append(name)
+    return failures
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline performance benchmarks on synthetic rasters")
+    parser.add_argument("--cases", default=",".join(CASES), help="Comma-separated subset of cases")
+    parser.add_argument("--size", type=int, default=1024, help="Raster width/height in pixels")
+    parser.add_argument("--bands", type=int, default=4)
+    parser.add_argument("--scenes", type=int, default=4)
+    parser.add_argument("--cloudiness", type=float, default=0.2)
+    parser.add_argument("--change-density", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "geogis_bench"))
+    parser.add_argument("--output", help="Write results JSON here")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline results JSON to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Allowed slowdown before failing (0.15 = 15%%)")
+    args = parser.parse_args(argv)
+
+    cases = [c for c in args.cases.split(",") if c]
+    unknown = set(cases) - set(CASES)
+    if unknown:
+        parser.error(f"Unknown cases: {sorted(unknown)}")
+
+    data = generate_dataset(args.data_dir, size=args.size, n_bands=args.bands, n_scenes=args.scenes,
+                            cloudiness=args.cloudiness, change_density=args.change_density, seed=args.seed)
+    results = run_benchmarks(cases, data, repeat=args.repeat)
+    report = {
+        "created_at": datetime.utcnow().isoformat(),
+        "machine": {"platform": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count()},
+        "params": data["params"],
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("params") != data["params"]:
+            print("Warning: baseline was recorded with different dataset parameters")
+        if compare(results, baseline, args.threshold, skipped=set(CASES) - set(cases)):
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Date, Float, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Date, Float, DateTime, ForeignKey, JSON, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 from geoalchemy2 import Geometry
@@ -40,3 +40,44 @@ class ChangeDetection(Base):
     geometry = Column(Geometry("POLYGON", srid=4326))
     area_ha = Column(Float)
     created_at = Column(DateTime, default=datetime.utcnow)
+
+class AdminBoundary(Base):
+    __tablename__ = "admin_boundaries"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String)
+    level = Column(Integer, index=True)  # 0 country, 1 province, 2 district, ...
+    parent_id = Column(Integer, ForeignKey("admin_boundaries.id"), index=True)
+    geometry = Column(Geometry("MULTIPOLYGON", srid=4326))
+
+class ChangeStat(Base):
+    """
+    Monthly change area per admin boundary and change type, rolled up from
+    `changes` by processing/rollups.py so the dashboard never aggregates polygons.
+    """
+    __tablename__ = "change_stats"
+    __table_args__ = (Index("ix_change_stats_lookup", "admin_id", "sensor", "month"),)
+
+    id = Column(Integer, primary_key=True)
+    month = Column(Date, index=True)  # First day of the target composite's month
+    sensor = Column(String)
+    admin_id = Column(Integer, ForeignKey("admin_boundaries.id"))
+    change_type = Column(String)
+    area_ha = Column(Float)
+    count = Column(Integer)  # Change polygons intersecting the boundary
+    updated_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+class Job(Base):
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String, index=True)  # ingest, process
+    params = Column(JSON)
+    status = Column(String, index=True, default="queued")  # queued, running, done, failed
+    stage = Column(String)  # Current pipeline stage
+    progress = Column(Float, default=0.0)  # 0..1
+    metrics = Column(JSON)  # Stage timings, bytes, pixels, peak memory
+    error = Column(String)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
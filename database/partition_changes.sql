@@ -0,0 +1,21 @@
+-- Convert changes into a table partitioned by target composite (one partition per
+-- month and sensor), so processing/loader.py can replace a month by attaching a
+-- freshly loaded partition. Existing rows move to the default partition and are
+-- cleared from it as their months are reloaded.
+BEGIN;
+
+ALTER TABLE changes RENAME TO changes_unpartitioned;
+ALTER SEQUENCE changes_id_seq OWNED BY NONE;
+
+CREATE TABLE changes (LIKE changes_unpartitioned INCLUDING DEFAULTS) PARTITION BY LIST (target_composite_id);
+ALTER TABLE changes ADD PRIMARY KEY (id, target_composite_id);
+ALTER TABLE changes ADD FOREIGN KEY (baseline_composite_id) REFERENCES composites (id);
+ALTER TABLE changes ADD FOREIGN KEY (target_composite_id) REFERENCES composites (id);
+CREATE INDEX ix_changes_geometry ON changes USING gist (geometry);
+CREATE TABLE changes_default PARTITION OF changes DEFAULT;
+
+INSERT INTO changes SELECT * FROM changes_unpartitioned;
+DROP TABLE changes_unpartitioned;
+ALTER SEQUENCE changes_id_seq OWNED BY changes.id;
+
+COMMIT;
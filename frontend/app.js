@@ -32,17 +32,17 @@ const ctx = document.getElementById('changeChart').getContext('2d');
 const changeChart = new Chart(ctx, {
     type: 'line',
     data: {
-        labels: ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'],
+        labels: [],
         datasets: [{
             label: 'Forest Loss',
-            data: [1200, 1500, 1800, 3000, 4500, 3800, 2500, 2000, 1500, 1200, 1000, 800],
+            data: [],
             borderColor: '#da3633',
             backgroundColor: 'rgba(218, 54, 51, 0.2)',
             fill: true,
             tension: 0.4
         }, {
             label: 'Forest Gain',
-            data: [400, 500, 600, 800, 700, 600, 500, 700, 900, 1100, 1200, 1300],
+            data: [],
             borderColor: '#238636',
             backgroundColor: 'rgba(35, 134, 54, 0.2)',
             fill: true,
@@ -71,6 +71,39 @@ const changeChart = new Chart(ctx, {
     }
 });
 
+// Load monthly change statistics (precomputed rollups served by the API)
+const API_BASE = window.location.protocol === 'file:' ? 'http://localhost:8000' : '';
+
+function monthLabel(month) {
+    const [year, m] = month.split('-').map(Number);
+    return new Date(year, m - 1, 1).toLocaleString('en', { month: 'short', year: 'numeric' });
+}
+
+function seriesTotal(stats, changeType) {
+    const total = stats.months.map(() => 0);
+    stats.series
+        .filter((s) => s.change_type === changeType)
+        .forEach((s) => s.area_ha.forEach((value, i) => { total[i] += value; }));
+    return total;
+}
+
+async function loadStats(params = {}) {
+    const query = new URLSearchParams(params).toString();
+    try {
+        const response = await fetch(`${API_BASE}/stats${query ? `?${query}` : ''}`);
+        if (!response.ok) throw new Error(`HTTP ${response.status}`);
+        const stats = await response.json();
+        changeChart.data.labels = stats.months.map(monthLabel);
+        changeChart.data.datasets[0].data = seriesTotal(stats, 'Loss');
+        changeChart.data.datasets[1].data = seriesTotal(stats, 'Gain');
+        changeChart.update();
+    } catch (err) {
+        console.error('Could not load change statistics', err);
+    }
+}
+
+loadStats();
+
 // Layer Toggles
 document.getElementById('loss-toggle').addEventListener('change', (e) => {
     if (e.target.checked) map.addLayer(mockLoss);
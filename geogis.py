@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+import argparse
+import logging
+import os
+import sys
+
+# Unified command line entry point: geogis <command> [options].
+# Only argparse is imported up front; each command imports its own
+# dependencies (torch, geopandas, rasterio, SQLAlchemy...) when it runs, so
+# `geogis --help` starts instantly.
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.join(ROOT, d) for d in ("processing", "ai", "database", "backend", "benchmarks")]
+
+INGESTERS = {"Sentinel-2": "ingest_s2", "Landsat": "ingest_l8", "Sentinel-1": "ingest_s1"}
+
+def cmd_ingest(args):
+    import importlib
+    from db import wait_for_db
+
+    module = importlib.import_module(INGESTERS[args.sensor])
+    wait_for_db()
+    date_range = f"{args.start}/{args.end}"
+    # Radar sees through clouds, so Sentinel-1 search takes no cloud filter
+    search_kwargs = {} if args.sensor == "Sentinel-1" else {"max_cloud_cover": args.max_cloud}
+    if args.tile:
+        for tile_id in args.tile:
+            module.ingest_tile(tile_id, date_range, **search_kwargs)
+        return 0
+    for item in module.search_scenes(tuple(args.bbox), date_range, **search_kwargs):
+        module.process_scene(item)
+    return 0
+
+def cmd_process(args):
+    from db import wait_for_db
+    from pipeline import run_tile_pipeline, run_monthly_pipeline
+
+    wait_for_db()
+    if args.tile:
+        for tile_id in args.tile:
+            run_tile_pipeline(args.year, args.month, tile_id, args.sensor, overwrite=True)
+        return 0
+    failed = run_monthly_pipeline(args.year, args.month, args.sensor, max_workers=args.workers)
+    return 1 if failed else 0
+
+def grid_resolution(value):
+    from tiling import check_resolution
+
+    try:
+        check_resolution(int(value))
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+    return int(value)
+
+def cmd_preview(args):
+    from datetime import datetime
+    from db import wait_for_db
+    from preview import run_monthly_preview
+
+    baseline = None
+    if args.baseline:
+        month = datetime.strptime(args.baseline, "%Y-%m")
+        baseline = (month.year, month.month)
+    wait_for_db()
+    result = run_monthly_preview(args.year, args.month, args.sensor, resolution=args.resolution,
+                                 baseline=baseline, max_workers=args.workers, overwrite=args.overwrite)
+    print(f"NDVI:   {result['ndvi']}\nChange: {result['change']}")
+    return 1 if result["failed"] else 0
+
+def cmd_infer(args):
+    if args.baseline:
+        from baseline import detect_change_baseline
+
+        detect_change_baseline(args.t1, args.t2, args.output, threshold=args.threshold)
+    else:
+        from inference import run_inference
+
+        run_inference(args.t1, args.t2, args.output, model_path=args.model)
+    return 0
+
+def cmd_vectorize(args):
+    from postprocess import vectorize_change
+
+    vectorize_change(args.raster, args.output)
+    return 0
+
+def cmd_stats(args):
+    import geopandas as gpd
+    from postprocess import calculate_area, zonal_statistics
+
+    changes = calculate_area(gpd.read_file(args.changes))
+    admin = gpd.read_file(args.admin).to_crs(changes.crs)
+    if args.admin_field != "admin_id":
+        admin = admin.rename(columns={args.admin_field: "admin_id"})
+    stats = zonal_statistics(changes, admin[["admin_id", "geometry"]])
+    if args.output:
+        stats.to_csv(args.output, index=False)
+    else:
+        print(stats.to_string(index=False))
+    return 0
+
+def cmd_load_changes(args):
+    from postprocess import vectorize_change
+    from loader import load_changes
+
+    gdf = vectorize_change(args.raster)
+    if gdf is None:
+        return 0
+    load_changes(gdf, args.baseline, args.target, confidence_path=args.confidence)
+    return 0
+
+def cmd_rollup(args):
+    from db import get_session
+    from rollups import refresh_change_stats
+
+    db = get_session()
+    try:
+        refresh_change_stats(db, args.composite)
+    finally:
+        db.close()
+    return 0
+
+def cmd_load_admin(args):
+    from db import get_session
+    from rollups import load_admin_boundaries
+
+    db = get_session()
+    try:
+        load_admin_boundaries(db, args.path, args.level, name_field=args.name_field)
+    finally:
+        db.close()
+    return 0
+
+def cmd_benchmark(args):
+    from run_benchmarks import main
+
+    return main(args.args)
+
+def cmd_train(args):
+    from train import main
+
+    main(args.args)
+    return 0
+
+def cmd_worker(args):
+    from main import main
+
+    main()
+    return 0
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="geogis", description="GeoGIS land change processing")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Debug logging")
+    commands = parser.add_subparsers(dest="command", metavar="command", required=True)
+
+    p = commands.add_parser("ingest", help="Search and download scenes into the catalog")
+    p.add_argument("start", help="Start date (YYYY-MM-DD)")
+    p.add_argument("end", help="End date (YYYY-MM-DD)")
+    p.add_argument("--sensor", choices=sorted(INGESTERS), default="Sentinel-2")
+    p.add_argument("--bbox", type=float, nargs=4, metavar=("W", "S", "E", "N"), default=(28.8, -2.9, 30.9, -1.0))
+    p.add_argument("--tile", action="append", help="Ingest grid tile(s) instead of --bbox")
+    p.add_argument("--max-cloud", type=float, default=20, help="Maximum cloud cover %% (optical sensors)")
+    p.set_defaults(func=cmd_ingest)
+
+    p = commands.add_parser("process", help="Build monthly composites and NDVI")
+    p.add_argument("year", type=int)
+    p.add_argument("month", type=int)
+    p.add_argument("--sensor", default="Sentinel-2")
+    p.add_argument("--tile", action="append", help="Only (re)run the given tile(s)")
+    p.add_argument("--workers", type=int, default=None)
+    p.set_defaults(func=cmd_process)
+
+    p = commands.add_parser("preview", help="Quick-look composite, NDVI and change at coarse resolution")
+    p.add_argument("year", type=int)
+    p.add_argument("month", type=int)
+    p.add_argument("--resolution", type=grid_resolution, default=160, help="Preview pixel size in metres (e.g. 80 or 160)")
+    p.add_argument("--baseline", help="Month to compare against, YYYY-MM (default: previous month)")
+    p.add_argument("--sensor", default="Sentinel-2")
+    p.add_argument("--workers", type=int, default=None)
+    p.add_argument("--overwrite", action="store_true", help="Recompute cached tile previews")
+    p.set_defaults(func=cmd_preview)
+
+    p = commands.add_parser("infer", help="Detect change between two images")
+    p.add_argument("t1")
+    p.add_argument("t2")
+    p.add_argument("output")
+    p.add_argument("--model", default=None, help="Model weights")
+    p.add_argument("--baseline", action="store_true", help="NDVI-difference baseline instead of the model (t1/t2 are NDVI rasters)")
+    p.add_argument("--threshold", type=float, default=0.2, help="Baseline NDVI change threshold")
+    p.set_defaults(func=cmd_infer)
+
+    p = commands.add_parser("vectorize", help="Polygonize a change raster to GeoPackage")
+    p.add_argument("raster")
+    p.add_argument("output")
+    p.set_defaults(func=cmd_vectorize)
+
+    p = commands.add_parser("stats", help="Change area per admin boundary and class")
+    p.add_argument("changes", help="Vectorized changes (GeoPackage)")
+    p.add_argument("admin", help="Admin boundaries (any format geopandas reads)")
+    p.add_argument("--admin-field", default="admin_id", help="Boundary identifier column")
+    p.add_argument("--output", help="Write CSV here instead of printing")
+    p.set_defaults(func=cmd_stats)
+
+    p = commands.add_parser("load-changes", help="Vectorize a change raster and bulk load it into the changes table")
+    p.add_argument("raster")
+    p.add_argument("--baseline", type=int, required=True, help="Baseline composite id")
+    p.add_argument("--target", type=int, required=True, help="Target composite id (its changes are replaced)")
+    p.add_argument("--confidence", help="Confidence raster on the same grid")
+    p.set_defaults(func=cmd_load_changes)
+
+    p = commands.add_parser("rollup", help="Refresh the precomputed change statistics served by /stats")
+    p.add_argument("--composite", type=int, action="append", help="Only months of these target composite ids (default: all)")
+    p.set_defaults(func=cmd_rollup)
+
+    p = commands.add_parser("load-admin", help="Load admin boundaries used by the change statistics")
+    p.add_argument("path")
+    p.add_argument("--level", type=int, required=True, help="0 country, 1 province, 2 district, ...")
+    p.add_argument("--name-field", default="name")
+    p.set_defaults(func=cmd_load_admin)
+
+    # Options of these two are parsed by the wrapped scripts themselves
+    p = commands.add_parser("benchmark", help="Offline benchmarks (options as in run_benchmarks.py)", add_help=False)
+    p.set_defaults(func=cmd_benchmark, passthrough=True)
+
+    p = commands.add_parser("train", help="Train ChangeNet (options as in train.py)", add_help=False)
+    p.set_defaults(func=cmd_train, passthrough=True)
+
+    p = commands.add_parser("worker", help="Run the job queue worker")
+    p.set_defaults(func=cmd_worker)
+    return parser
+
+def main(argv=None):
+    parser = build_parser()
+    args, extra = parser.parse_known_args(argv)
+    if getattr(args, "passthrough", False):
+        args.args = extra
+    elif extra:
+        parser.error(f"unrecognized arguments: {' '.join(extra)}")
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO)
+    return args.func(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
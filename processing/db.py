@@ -0,0 +1,56 @@
+import os
+import time
+import logging
+
+# Database access shared by the processing modules.
+# The engine is created on first use rather than at import, so importing an
+# ingester or the pipeline (e.g. for --help, or in a forked worker) never
+# touches the database.
+
+DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://user:password@db:5432/geogis")
+
+logger = logging.getLogger(__name__)
+
+_engine = None
+_sessionmaker = None
+
+def get_engine():
+    global _engine, _sessionmaker
+    if _engine is None:
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import sessionmaker
+
+        _engine = create_engine(DATABASE_URL)
+        _sessionmaker = sessionmaker(bind=_engine)
+    return _engine
+
+def get_session():
+    get_engine()
+    return _sessionmaker()
+
+def get_db():
+    db = get_session()
+    try:
+        yield db
+    finally:
+        db.close()
+
+def dispose_engine():
+    # Forked workers must not reuse the parent's pooled connections
+    if _engine is not None:
+        _engine.dispose(close=False)
+
+def wait_for_db(timeout=60, interval=1.0):
+    """
+    Block until the database accepts connections (e.g. while its container starts).
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with get_engine().connect():
+                return
+        except Exception:
+            if time.monotonic() >= deadline:
+                raise
+            logger.info("Waiting for database...")
+            time.sleep(interval)
@@ -2,32 +2,21 @@ import os
 import logging
 from pystac_client import Client
 import requests
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
 from geoalchemy2.shape import from_shape
 from shapely.geometry import shape
+from tiling import tile_bounds_lonlat
+from metrics import timed, count, span
+from db import get_db, wait_for_db
 from models import Scene
 
 # Configuration
 STAC_API_URL = "https://earth-search.aws.element84.com/v1"
 COLLECTION = "sentinel-1-grd" 
-DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://user:password@db:5432/geogis")
 DATA_DIR = os.getenv("DATA_DIR", "data")
 
-# Setup DB
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(bind=engine)
-
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
+@timed("search")
 def search_scenes(bbox, date_range):
     client = Client.open(STAC_API_URL)
     search = client.search(
@@ -40,12 +29,14 @@ def search_scenes(bbox, date_range):
     logger.info(f"Found {len(items)} scenes")
     return items
 
+@timed("download")
 def download_file(url, output_path):
     response = requests.get(url, stream=True)
     if response.status_code == 200:
         with open(output_path, 'wb') as f:
             for chunk in response.iter_content(chunk_size=8192):
                 f.write(chunk)
+                count(nbytes=len(chunk))
         return True
     return False
 
@@ -72,26 +63,36 @@ def process_scene(item):
                 downloaded = True
 
     if downloaded:
-        db = next(get_db())
-        existing = db.query(Scene).filter(Scene.stac_id == scene_id).first()
+        with span("db_write"):
+            db = next(get_db())
+            existing = db.query(Scene).filter(Scene.stac_id == scene_id).first()
         
-        if not existing:
-            geom = shape(item.geometry)
-            scene = Scene(
-                stac_id=scene_id,
-                sensor="Sentinel-1",
-                acquisition_date=item.datetime.date(),
-                cloud_cover=0, # SAR has no clouds
-                geometry=from_shape(geom, srid=4326),
-                storage_path=scene_dir
-            )
-            db.add(scene)
-            db.commit()
-            logger.info(f"Saved metadata for {scene_id}")
+            if not existing:
+                geom = shape(item.geometry)
+                scene = Scene(
+                    stac_id=scene_id,
+                    sensor="Sentinel-1",
+                    acquisition_date=item.datetime.date(),
+                    cloud_cover=0, # SAR has no clouds
+                    geometry=from_shape(geom, srid=4326),
+                    storage_path=scene_dir
+                )
+                db.add(scene)
+                db.commit()
+                logger.info(f"Saved metadata for {scene_id}")
+
+def ingest_tile(tile_id, date_range, **search_kwargs):
+    """
+    Ingest all scenes intersecting one tile of the national grid.
+    """
+    items = search_scenes(tile_bounds_lonlat(tile_id), date_range, **search_kwargs)
+    for item in items:
+        process_scene(item)
+    return items
 
 if __name__ == "__main__":
-    import time
-    time.sleep(5)
+    logging.basicConfig(level=logging.INFO)
+    wait_for_db()
     bbox = (28.8, -2.9, 30.9, -1.0)
     dates = "2023-01-01/2023-01-10"
     items = search_scenes(bbox, dates)
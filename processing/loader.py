@@ -0,0 +1,160 @@
+import io
+import logging
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import shapely
+from metrics import timed, count
+
+# Bulk loading of vectorized change polygons into the changes table.
+# Rows are prepared column-wise (equal-area areas, reprojection, hex EWKB),
+# streamed in chunks with COPY FROM STDIN into a staging table and then
+# swapped in for the target composite in one transaction. When changes is
+# partitioned by target_composite_id (database/partition_changes.sql) the
+# staging table is attached as that composite's partition, otherwise rows are
+# moved with DELETE + INSERT ... SELECT.
+
+CHANGE_TYPES = {1: "Loss", 2: "Gain", 3: "Degradation"}
+AREA_CRS = "EPSG:6933"  # Equal area, same as the tiling grid
+CHUNK_SIZE = 100000
+BLOCK_SIZE = 1024  # confidence raster window for polygon_confidence
+COLUMNS = ["baseline_composite_id", "target_composite_id", "change_type", "confidence",
+           "geometry", "area_ha", "created_at"]
+
+logger = logging.getLogger(__name__)
+
+def _windows(width, height, block_size):
+    from rasterio.windows import Window
+
+    for row in range(0, height, block_size):
+        for col in range(0, width, block_size):
+            yield Window(col, row, min(block_size, width - col), min(block_size, height - row))
+
+def polygon_confidence(gdf, confidence_path, block_size=BLOCK_SIZE):
+    """
+    Mean of the confidence raster under each polygon. gdf must be in the
+    raster's CRS (as returned by vectorize_change). Integer rasters are
+    read as percentages. The raster is read block by block and only the
+    polygons touching a block are burned into it.
+    """
+    import rasterio
+    from rasterio.features import rasterize
+    from rasterio.windows import bounds
+
+    geoms = gdf.geometry.values.to_numpy()
+    tree = shapely.STRtree(geoms)
+    sums = np.zeros(len(gdf) + 1)
+    counts = np.zeros(len(gdf) + 1, dtype=np.int64)
+    with rasterio.open(confidence_path) as src:
+        scale = 100.0 if np.issubdtype(src.dtypes[0], np.integer) else 1.0
+        for window in _windows(src.width, src.height, block_size):
+            # Sorted so overlapping polygons burn in the same order as a full-raster pass
+            hits = np.sort(tree.query(shapely.box(*bounds(window, src.transform))))
+            if not len(hits):
+                continue
+            conf = src.read(1, window=window, masked=True).astype(np.float32).filled(np.nan)
+            ids = rasterize(((geoms[i], i + 1) for i in hits), out_shape=conf.shape,
+                            transform=src.window_transform(window), fill=0, dtype="int32")
+            valid = (ids > 0) & np.isfinite(conf)
+            sums += np.bincount(ids[valid], weights=conf[valid], minlength=len(gdf) + 1)
+            counts += np.bincount(ids[valid], minlength=len(gdf) + 1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (sums / counts)[1:] / scale
+
+def prepare_changes(gdf, baseline_composite_id, target_composite_id, confidence=None):
+    """
+    Turn vectorize_change output (class_id + geometry) into rows of the
+    changes table, with the geometry as hex EWKB in SRID 4326.
+    """
+    rows = pd.DataFrame({
+        "baseline_composite_id": baseline_composite_id,
+        "target_composite_id": target_composite_id,
+        "change_type": gdf["class_id"].map(CHANGE_TYPES),
+        "confidence": confidence if confidence is not None else np.nan,
+        "area_ha": gdf.geometry.to_crs(AREA_CRS).area.to_numpy() / 10000.0,
+        "created_at": datetime.utcnow().isoformat(sep=" "),
+    }, index=gdf.index)
+    geoms = shapely.set_srid(gdf.geometry.to_crs(epsg=4326).values.to_numpy(), 4326)
+    rows["geometry"] = shapely.to_wkb(geoms, hex=True, include_srid=True)
+    rows = rows[rows["change_type"].notna()]  # Stable/NoData classes are not stored
+    return rows[COLUMNS]
+
+def _is_partitioned(cur):
+    cur.execute("SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+                "WHERE c.relname = 'changes'")
+    return cur.fetchone() is not None
+
+def _copy_chunks(cur, table, rows, chunk_size):
+    copy_sql = f"COPY {table} ({', '.join(COLUMNS)}) FROM STDIN WITH (FORMAT csv)"
+    for start in range(0, len(rows), chunk_size):
+        buffer = io.StringIO()
+        rows.iloc[start:start + chunk_size].to_csv(buffer, header=False, index=False, na_rep="")
+        buffer.seek(0)
+        cur.copy_expert(copy_sql, buffer)
+        count(nbytes=buffer.tell())
+
+def _swap_partition(cur, target_composite_id, staging):
+    partition = f"changes_c{target_composite_id}"
+    # The CHECK constraint lets ATTACH skip scanning the new partition
+    cur.execute(f"ALTER TABLE {staging} ALTER COLUMN target_composite_id SET NOT NULL, "
+                f"ADD CONSTRAINT {staging}_target CHECK (target_composite_id = {target_composite_id})")
+    cur.execute(f"ALTER TABLE {staging} ADD PRIMARY KEY (id, target_composite_id)")
+    cur.execute(f"CREATE INDEX ON {staging} USING gist (geometry)")
+    cur.execute(f"ANALYZE {staging}")
+
+    cur.execute(f"DROP TABLE IF EXISTS {partition}")  # Also detaches it
+    cur.execute("DELETE FROM changes WHERE target_composite_id = %s", (target_composite_id,))  # Default partition
+    cur.execute(f"ALTER TABLE changes ATTACH PARTITION {staging} FOR VALUES IN ({target_composite_id})")
+    cur.execute(f"ALTER TABLE {staging} RENAME TO {partition}")
+
+def _swap_rows(cur, target_composite_id, staging):
+    cur.execute("DELETE FROM changes WHERE target_composite_id = %s", (target_composite_id,))
+    cur.execute(f"INSERT INTO changes ({', '.join(COLUMNS)}) SELECT {', '.join(COLUMNS)} FROM {staging}")
+    cur.execute(f"DROP TABLE {staging}")
+
+@timed("load")
+def load_changes(gdf, baseline_composite_id, target_composite_id, engine=None, confidence_path=None,
+                 chunk_size=CHUNK_SIZE, refresh_stats=True):
+    """
+    Replace all changes of target_composite_id with the polygons in gdf
+    (vectorize_change output). Readers see either the old or the new set.
+    Returns the number of rows loaded.
+    """
+    from db import get_engine, get_session
+
+    target_composite_id = int(target_composite_id)
+    confidence = polygon_confidence(gdf, confidence_path) if confidence_path else None
+    rows = prepare_changes(gdf, baseline_composite_id, target_composite_id, confidence)
+
+    staging = f"changes_c{target_composite_id}_load"
+    raw = (engine or get_engine()).raw_connection()
+    try:
+        cur = raw.cursor()
+        partitioned = _is_partitioned(cur)
+        cur.execute(f"DROP TABLE IF EXISTS {staging}")
+        # A partition must be logged; a plain staging table is only read once
+        cur.execute(f"CREATE {'' if partitioned else 'UNLOGGED '}TABLE {staging} (LIKE changes INCLUDING DEFAULTS)")
+        _copy_chunks(cur, staging, rows, chunk_size)
+        raw.commit()
+
+        if partitioned:
+            _swap_partition(cur, target_composite_id, staging)
+        else:
+            _swap_rows(cur, target_composite_id, staging)
+        raw.commit()
+    except Exception:
+        raw.rollback()
+        raise
+    finally:
+        raw.close()
+    logger.info(f"Loaded {len(rows)} changes for composite {target_composite_id}")
+
+    if refresh_stats:
+        from rollups import refresh_change_stats
+
+        db = get_session()
+        try:
+            refresh_change_stats(db, [target_composite_id])
+        finally:
+            db.close()
+    return len(rows)
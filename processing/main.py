@@ -1,11 +1,120 @@
 import time
 import os
+import logging
+from datetime import datetime
+from models import Job
+from metrics import MetricsRecorder, get_recorder, use_recorder
+from db import get_session, wait_for_db
+
+# Configuration
+POLL_INTERVAL = int(os.getenv("POLL_INTERVAL", "60"))
+FLUSH_INTERVAL = 5  # seconds between job progress writes
+
+logger = logging.getLogger(__name__)
+
+class JobTracker:
+    """
+    Recorder callback that persists progress and stage metrics to the jobs table.
+    Writes are throttled so instrumentation stays cheap on long runs.
+    """
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self._last_flush = 0.0
+
+    def __call__(self, recorder, force=False):
+        now = time.monotonic()
+        if not force and now - self._last_flush < FLUSH_INTERVAL:
+            return
+        self._last_flush = now
+
+        snapshot = recorder.snapshot()
+        progress = snapshot["progress"]
+        db = get_session()
+        try:
+            job = db.get(Job, self.job_id)
+            job.stage = progress["stage"]
+            if progress["total"]:
+                job.progress = progress["done"] / progress["total"]
+            job.metrics = snapshot
+            db.commit()
+        finally:
+            db.close()
+
+def claim_job():
+    """
+    Atomically take the oldest queued job (safe with several workers).
+    """
+    db = get_session()
+    try:
+        job = db.query(Job).filter(Job.status == "queued").order_by(Job.id) \
+            .with_for_update(skip_locked=True).first()
+        if not job:
+            return None
+        job.status = "running"
+        job.started_at = datetime.utcnow()
+        db.commit()
+        return job.id, job.kind, job.params or {}
+    finally:
+        db.close()
+
+def finish_job(job_id, status, error=None):
+    db = get_session()
+    try:
+        job = db.get(Job, job_id)
+        job.status = status
+        job.error = error
+        job.finished_at = datetime.utcnow()
+        if status == "done":
+            job.progress = 1.0
+        db.commit()
+    finally:
+        db.close()
+
+def run_ingest(params):
+    import ingest_s2, ingest_l8, ingest_s1
+
+    ingesters = {"Sentinel-2": ingest_s2, "Landsat": ingest_l8, "Sentinel-1": ingest_s1}
+    module = ingesters[params.get("sensor", "Sentinel-2")]
+    items = module.search_scenes(params["bbox"], f"{params['start_date']}/{params['end_date']}")
+    recorder = get_recorder()
+    for idx, item in enumerate(items):
+        module.process_scene(item)
+        recorder.set_progress(idx + 1, len(items))
+
+def run_process(params):
+    from pipeline import run_monthly_pipeline
+
+    failed = run_monthly_pipeline(params["year"], params["month"], params.get("sensor", "Sentinel-2"))
+    if failed:
+        raise RuntimeError(f"{len(failed)} tiles failed: {sorted(failed)}")
+
+JOB_RUNNERS = {"ingest": run_ingest, "process": run_process}
+
+def run_job(job_id, kind, params):
+    tracker = JobTracker(job_id)
+    recorder = MetricsRecorder(on_update=tracker)
+    status, error = "done", None
+    with use_recorder(recorder):
+        try:
+            JOB_RUNNERS[kind](params)
+        except Exception as e:
+            logger.exception(f"Job {job_id} failed")
+            status, error = "failed", str(e)
+    tracker(recorder, force=True)
+    finish_job(job_id, status, error)
+    logger.info(f"Job {job_id} ({kind}) {status}")
 
 def main():
-    print("Processing service started...")
+    wait_for_db()
+    logger.info("Processing service started...")
     while True:
-        print("Waiting for jobs...")
-        time.sleep(60)
+        claimed = claim_job()
+        if claimed:
+            run_job(*claimed)
+            continue
+        logger.info("Waiting for jobs...")
+        time.sleep(POLL_INTERVAL)
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
     main()
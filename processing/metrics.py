@@ -0,0 +1,175 @@
+import contextvars
+import functools
+import os
+import resource
+import threading
+import time
+from contextlib import contextmanager
+
+# Lightweight stage instrumentation.
+# Timing uses perf_counter and peak memory the kernel's RSS high-water mark,
+# reset at the start of every span (Linux), so a span costs some tens of
+# microseconds and can stay enabled in production. Spans are recorded into
+# the current MetricsRecorder (one per job / worker process).
+
+def peak_rss_bytes():
+    """
+    Peak resident set size of this process since the last reset_peak_rss().
+    Falls back to the lifetime peak where /proc is not available.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 # Linux reports KiB
+
+def reset_peak_rss():
+    """
+    Reset the RSS high-water mark to the current RSS, so long-lived workers
+    report the peak of each stage rather than of their whole lifetime.
+    Returns False where the kernel does not support it.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+class Span:
+    """
+    A running stage measurement. Callers add bytes/pixels while the span is open.
+    """
+    __slots__ = ("stage", "bytes", "pixels", "peak_rss")
+
+    def __init__(self, stage):
+        self.stage = stage
+        self.bytes = 0
+        self.pixels = 0
+        self.peak_rss = 0
+
+class MetricsRecorder:
+    def __init__(self, on_update=None):
+        """
+        on_update: optional callable(recorder) invoked after each span and
+        progress change (e.g. to persist job state).
+        """
+        self.stages = {}
+        self.progress = {"done": 0, "total": 0, "stage": None}
+        self.on_update = on_update
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, stage):
+        s = Span(stage)
+        # The high-water mark is process-wide: hand what the enclosing span
+        # reached so far to it before resetting, and our peak back at the end
+        parent = _active_span.get()
+        if parent is not None:
+            parent.peak_rss = max(parent.peak_rss, peak_rss_bytes())
+        reset_peak_rss()
+        token = _active_span.set(s)
+        start = time.perf_counter()
+        self.progress["stage"] = stage
+        try:
+            yield s
+        finally:
+            _active_span.reset(token)
+            s.peak_rss = max(s.peak_rss, peak_rss_bytes())
+            if parent is not None:
+                parent.peak_rss = max(parent.peak_rss, s.peak_rss)
+            self.record(stage, time.perf_counter() - start, s.bytes, s.pixels, peak_rss=s.peak_rss)
+
+    def record(self, stage, seconds, nbytes=0, pixels=0, calls=1, peak_rss=None):
+        peak_rss = peak_rss if peak_rss is not None else peak_rss_bytes()
+        with self._lock:
+            stats = self.stages.setdefault(
+                stage, {"calls": 0, "seconds": 0.0, "bytes": 0, "pixels": 0, "peak_rss": 0})
+            stats["calls"] += calls
+            stats["seconds"] += seconds
+            stats["bytes"] += nbytes
+            stats["pixels"] += pixels
+            stats["peak_rss"] = max(stats["peak_rss"], peak_rss)
+        self._notify()
+
+    def set_progress(self, done, total):
+        self.progress["done"] = done
+        self.progress["total"] = total
+        self._notify()
+
+    def merge(self, snapshot):
+        """
+        Fold in stage metrics from another recorder (e.g. a tile worker process).
+        """
+        for stage, stats in snapshot.get("stages", {}).items():
+            self.record(stage, stats["seconds"], stats["bytes"], stats["pixels"],
+                        calls=stats["calls"], peak_rss=stats["peak_rss"])
+
+    def snapshot(self):
+        with self._lock:
+            stages = {}
+            for stage, stats in self.stages.items():
+                stats = dict(stats)
+                stats["mpix_per_s"] = stats["pixels"] / stats["seconds"] / 1e6 if stats["seconds"] else 0.0
+                stages[stage] = stats
+        return {"stages": stages, "progress": dict(self.progress), "peak_rss": peak_rss_bytes()}
+
+    def _notify(self):
+        if self.on_update:
+            self.on_update(self)
+
+_default_recorder = MetricsRecorder()
+_current = contextvars.ContextVar("metrics_recorder", default=_default_recorder)
+_active_span = contextvars.ContextVar("metrics_span", default=None)
+
+def get_recorder():
+    return _current.get()
+
+@contextmanager
+def use_recorder(recorder):
+    """
+    Route spans in this context to the given recorder.
+    """
+    token = _current.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _current.reset(token)
+
+def span(stage):
+    """
+    Time a stage on the current recorder:
+
+        with span("composite") as s:
+            ...
+            s.pixels += width * height
+    """
+    return get_recorder().span(stage)
+
+def timed(stage):
+    """
+    Decorator form of span() for whole stage functions.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def count(pixels=0, nbytes=0, path=None):
+    """
+    Add pixel/byte counts to the innermost open span.
+    If path is given, its file size is added to the byte count.
+    """
+    s = _active_span.get()
+    if s is None:
+        return
+    s.pixels += pixels
+    s.bytes += nbytes
+    if path and os.path.exists(path):
+        s.bytes += os.path.getsize(path)
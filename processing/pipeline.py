@@ -1,109 +1,225 @@
 import os
 import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import func
+from geoalchemy2.shape import from_shape
+from shapely.geometry import box
 from models import Scene, Composite
-from preprocess import reproject_resample, calculate_ndvi, create_median_composite, filter_speckle
+from preprocess import reproject_to_tile, calculate_ndvi, create_median_composite
+from tiling import DEFAULT_AOI, tiles_for_aoi, tile_bounds_lonlat, build_vrt
+from metrics import MetricsRecorder, get_recorder, use_recorder, span
+from db import get_db, dispose_engine, wait_for_db
 
 # Configuration
-DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://user:password@db:5432/geogis")
 DATA_DIR = os.getenv("DATA_DIR", "data")
+PUBLISH_BACKEND = os.getenv("PUBLISH_BACKEND")  # local, s3 or supabase; unset = don't publish
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(bind=engine)
-
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-def run_monthly_pipeline(year, month, sensor="Sentinel-2"):
+def month_range(year, month):
     """
-    Run the full pipeline for a specific month.
+    Start (inclusive) and end (exclusive) dates of a month as ISO strings.
     """
-    db = next(get_db())
-    
-    # 1. Query scenes for the month
     start_date = f"{year}-{month:02d}-01"
     if month == 12:
         end_date = f"{year+1}-01-01"
     else:
         end_date = f"{year}-{month+1:02d}-01"
-        
-    scenes = db.query(Scene).filter(
-        Scene.sensor == sensor,
-        Scene.acquisition_date >= start_date,
-        Scene.acquisition_date < end_date
-    ).all()
-    
+    return start_date, end_date
+
+def tile_composite_dir(year, month, tile_id):
+    return os.path.join(DATA_DIR, "composites", str(year), str(month), tile_id)
+
+def find_scenes(year, month, tile_id, sensor="Sentinel-2"):
+    """
+    Scenes of a month whose footprint intersects a tile.
+    """
+    start_date, end_date = month_range(year, month)
+    west, south, east, north = tile_bounds_lonlat(tile_id)
+
+    with span("db_query"):
+        db = next(get_db())
+        scenes = db.query(Scene).filter(
+            Scene.sensor == sensor,
+            Scene.acquisition_date >= start_date,
+            Scene.acquisition_date < end_date,
+            func.ST_Intersects(Scene.geometry, func.ST_MakeEnvelope(west, south, east, north, 4326))
+        ).all()
+        db.close()
+    return scenes
+
+def scene_band_path(scene, band):
+    # Find the file (naming convention from ingest)
+    for f in os.listdir(scene.storage_path):
+        if band in f:
+            return os.path.join(scene.storage_path, f)
+    return None
+
+def run_tile_pipeline(year, month, tile_id, sensor="Sentinel-2", overwrite=False):
+    """
+    Run preprocessing, compositing and NDVI for a single tile of the grid.
+    Tiles are independent, so a failed tile can be retried on its own.
+    Returns the tile composite directory, or None if no scenes cover the tile.
+    """
+    composite_dir = tile_composite_dir(year, month, tile_id)
+    ndvi_path = os.path.join(composite_dir, "ndvi.tif")
+    if os.path.exists(ndvi_path) and not overwrite:
+        logger.info(f"Tile {tile_id} already processed for {year}-{month}")
+        return composite_dir
+
+    scenes = find_scenes(year, month, tile_id, sensor)
     if not scenes:
-        logger.info(f"No scenes found for {year}-{month}")
-        return
+        logger.info(f"No scenes found for tile {tile_id} in {year}-{month}")
+        return None
 
-    logger.info(f"Processing {len(scenes)} scenes for {year}-{month}")
-    
-    # 2. Preprocess each scene (Reproject/Resample)
+    logger.info(f"Processing {len(scenes)} scenes for tile {tile_id} in {year}-{month}")
+
+    # 1. Reproject each scene onto the tile grid
     processed_files = {"red": [], "nir": []} # Track paths for compositing
-    
+
     for scene in scenes:
-        # Example: Process Red and NIR bands
-        bands = ["red", "nir"]
-        for band in bands:
-            # Find the file
-            # In a real system, we'd have a better way to map band names to files
-            # Here we assume a naming convention from ingest
-            input_path = None
-            for f in os.listdir(scene.storage_path):
-                if band in f:
-                    input_path = os.path.join(scene.storage_path, f)
-                    break
-            
+        for band in processed_files:
+            input_path = scene_band_path(scene, band)
             if input_path:
-                output_dir = os.path.join(DATA_DIR, "processed", str(year), str(month), scene.stac_id)
+                output_dir = os.path.join(DATA_DIR, "processed", str(year), str(month), tile_id, scene.stac_id)
                 os.makedirs(output_dir, exist_ok=True)
                 output_path = os.path.join(output_dir, f"{band}.tif")
-                
-                if not os.path.exists(output_path):
-                    reproject_resample(input_path, output_path)
-                
+
+                if not os.path.exists(output_path) or overwrite:
+                    reproject_to_tile(input_path, output_path, tile_id)
+
                 processed_files[band].append(output_path)
 
-    # 3. Create Composites
-    composite_dir = os.path.join(DATA_DIR, "composites", str(year), str(month))
+    # 2. Create Composites
     os.makedirs(composite_dir, exist_ok=True)
-    
+
     for band, paths in processed_files.items():
         if paths:
             output_path = os.path.join(composite_dir, f"{band}_composite.tif")
             create_median_composite(paths, output_path)
-            logger.info(f"Created {band} composite")
+            logger.info(f"Created {band} composite for tile {tile_id}")
 
-    # 4. Calculate NDVI Composite
+    # 3. Calculate NDVI Composite
     red_comp = os.path.join(composite_dir, "red_composite.tif")
     nir_comp = os.path.join(composite_dir, "nir_composite.tif")
-    
-    if os.path.exists(red_comp) and os.path.exists(nir_comp):
-        ndvi_path = os.path.join(composite_dir, "ndvi.tif")
-        calculate_ndvi(red_comp, nir_comp, ndvi_path)
-        logger.info("Created NDVI composite")
-        
-        # Save Composite Metadata
-        comp = Composite(
-            start_date=datetime.strptime(start_date, "%Y-%m-%d").date(),
-            end_date=datetime.strptime(end_date, "%Y-%m-%d").date(),
-            sensor=sensor,
-            storage_path=composite_dir,
-            # geometry=... (union of scene geometries)
-        )
-        db.add(comp)
+
+    if not (os.path.exists(red_comp) and os.path.exists(nir_comp)):
+        return None
+
+    calculate_ndvi(red_comp, nir_comp, ndvi_path)
+    logger.info(f"Created NDVI composite for tile {tile_id}")
+    return composite_dir
+
+def _init_worker():
+    dispose_engine()
+
+def _run_tile(year, month, tile_id, sensor):
+    # Worker entry point: collect stage metrics locally and ship them back
+    recorder = MetricsRecorder()
+    with use_recorder(recorder):
+        tile_dir = run_tile_pipeline(year, month, tile_id, sensor)
+    return tile_dir, recorder.snapshot()
+
+def run_monthly_pipeline(year, month, sensor="Sentinel-2", aoi=DEFAULT_AOI, max_workers=None):
+    """
+    Run the full pipeline for a specific month.
+    The AOI is split into tiles of the national grid which are processed in
+    parallel and stitched into VRT mosaics. Returns the list of failed tiles.
+    """
+    tiles = tiles_for_aoi(aoi)
+    logger.info(f"Processing {len(tiles)} tiles for {year}-{month}")
+
+    recorder = get_recorder()
+    recorder.set_progress(0, len(tiles))
+    tile_dirs = {}
+    failed = []
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker) as executor:
+        futures = {
+            executor.submit(_run_tile, year, month, tile_id, sensor): tile_id
+            for tile_id in tiles
+        }
+        for future in as_completed(futures):
+            tile_id = futures[future]
+            try:
+                tile_dir, snapshot = future.result()
+            except Exception as e:
+                logger.error(f"Tile {tile_id} failed: {e}")
+                failed.append(tile_id)
+            else:
+                recorder.merge(snapshot)
+                if tile_dir:
+                    tile_dirs[tile_id] = tile_dir
+            recorder.set_progress(len(tile_dirs) + len(failed), len(tiles))
+
+    if failed:
+        logger.warning(f"{len(failed)} tiles failed, retry with run_tile_pipeline: {sorted(failed)}")
+
+    if not tile_dirs:
+        logger.info(f"No tiles produced for {year}-{month}")
+        return failed
+
+    # Mosaic tile outputs
+    composite_dir = os.path.join(DATA_DIR, "composites", str(year), str(month))
+    with span("mosaic"):
+        for name in ("red_composite", "nir_composite", "ndvi"):
+            paths = [os.path.join(d, f"{name}.tif") for d in tile_dirs.values()]
+            build_vrt(paths, os.path.join(composite_dir, f"{name}.vrt"))
+    logger.info(f"Mosaicked {len(tile_dirs)} tiles for {year}-{month}")
+
+    # Save Composite Metadata
+    start_date, end_date = month_range(year, month)
+    with span("db_write"):
+        db = next(get_db())
+        start = datetime.strptime(start_date, "%Y-%m-%d").date()
+        end = datetime.strptime(end_date, "%Y-%m-%d").date()
+        comp = db.query(Composite).filter(
+            Composite.start_date == start,
+            Composite.end_date == end,
+            Composite.sensor == sensor
+        ).first()
+        if not comp:
+            # Re-running a month (e.g. after retrying failed tiles) only refreshes mosaics
+            comp = Composite(start_date=start, end_date=end, sensor=sensor)
+            db.add(comp)
+        comp.storage_path = composite_dir
+        comp.geometry = from_shape(box(*aoi), srid=4326)
         db.commit()
+        db.close()
+
+    if PUBLISH_BACKEND:
+        publish_month(year, month)
+    return failed
+
+def publish_month(year, month):
+    """
+    Upload a month's composites and mosaics, skipping unchanged files.
+    """
+    from publish import Publisher, backend_from_env
+
+    composite_dir = os.path.join(DATA_DIR, "composites", str(year), str(month))
+    publisher = Publisher(backend_from_env(), os.path.join(DATA_DIR, "publish_manifest.json"))
+    with span("publish"):
+        urls, report = publisher.publish_dir(composite_dir, prefix=f"composites/{year}/{month:02d}")
+    logger.info(f"Published {len(report['uploaded'])} files, {len(report['skipped'])} unchanged, "
+                f"{len(report['failed'])} failed for {year}-{month}")
+    return urls
 
 if __name__ == "__main__":
-    # Example run
-    run_monthly_pipeline(2023, 1)
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the monthly compositing pipeline")
+    parser.add_argument("year", type=int)
+    parser.add_argument("month", type=int)
+    parser.add_argument("--sensor", default="Sentinel-2")
+    parser.add_argument("--tile", action="append", help="Only (re)run the given tile(s); rerun without --tile to refresh mosaics")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    wait_for_db()
+    if args.tile:
+        for tile_id in args.tile:
+            run_tile_pipeline(args.year, args.month, tile_id, args.sensor, overwrite=True)
+    else:
+        run_monthly_pipeline(args.year, args.month, args.sensor, max_workers=args.workers)
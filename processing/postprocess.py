@@ -4,14 +4,19 @@ import geopandas as gpd
 from shapely.geometry import shape
 import pandas as pd
 import numpy as np
+import os
+from metrics import timed, count
 
-def vectorize_change(raster_path, output_path):
+@timed("vectorize")
+def vectorize_change(raster_path, output_path=None):
     """
-    Convert change raster to vector (GeoPackage).
+    Convert change raster to vector polygons, also saved as a GeoPackage
+    when output_path is given.
     """
     with rasterio.open(raster_path) as src:
         image = src.read(1)
         mask = image > 0 # Ignore 0 (Stable/NoData)
+        count(pixels=image.size)
         
         results = (
             {'properties': {'class_id': int(v)}, 'geometry': s}
@@ -28,10 +33,31 @@ def vectorize_change(raster_path, output_path):
         gdf = gpd.GeoDataFrame.from_features(geoms)
         gdf.crs = src.crs
         
-        # Save
-        gdf.to_file(output_path, driver="GPKG")
+        if output_path:
+            gdf.to_file(output_path, driver="GPKG")
         return gdf
 
+def vectorize_tiles(tile_rasters, output_path):
+    """
+    Vectorize per-tile change rasters ({tile_id: path}) and merge them into
+    one GeoPackage with a tile_id column. Polygons crossing tile edges are
+    split at the tile boundary.
+    """
+    frames = []
+    for tile_id, raster_path in sorted(tile_rasters.items()):
+        tile_output = os.path.join(os.path.dirname(raster_path), "change.gpkg")
+        gdf = vectorize_change(raster_path, tile_output)
+        if gdf is not None:
+            gdf['tile_id'] = tile_id
+            frames.append(gdf)
+
+    if not frames:
+        return None
+
+    gdf = gpd.GeoDataFrame(pd.concat(frames, ignore_index=True), crs=frames[0].crs)
+    gdf.to_file(output_path, driver="GPKG")
+    return gdf
+
 def calculate_area(gdf):
     """
     Calculate area in hectares for each polygon.
@@ -47,6 +73,7 @@ def calculate_area(gdf):
     gdf['area_ha'] = gdf.geometry.area / 10000.0
     return gdf
 
+@timed("zonal_stats")
 def zonal_statistics(change_gdf, admin_gdf):
     """
     Calculate change statistics per admin boundary.
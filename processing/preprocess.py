@@ -1,15 +1,30 @@
 import rasterio
 from rasterio.warp import calculate_default_transform, reproject, Resampling
 from rasterio.enums import Resampling as ResamplingEnums
+from rasterio.windows import Window
 import numpy as np
 import os
-from scipy.ndimage import median_filter
+from contextlib import ExitStack
+from tiling import GRID_CRS, tile_grid
+from metrics import timed, count
+from raster_writer import open_cog, write_cog
+from remote_cache import open_raster
 
+# Composites and NDVI are computed block by block, so a worker holds about
+# 30 bytes per pixel per scene of one block rather than of the whole tile
+BLOCK_SIZE = 1024
+
+def _windows(width, height, block_size):
+    for row in range(0, height, block_size):
+        for col in range(0, width, block_size):
+            yield Window(col, row, min(block_size, width - col), min(block_size, height - row))
+
+@timed("reproject")
 def reproject_resample(input_path, output_path, dst_crs='EPSG:3857', resolution=10):
     """
     Reproject and resample a raster to a target CRS and resolution.
     """
-    with rasterio.open(input_path) as src:
+    with open_raster(input_path) as src:
         transform, width, height = calculate_default_transform(
             src.crs, dst_crs, src.width, src.height, *src.bounds, resolution=resolution)
         
@@ -21,7 +36,7 @@ def reproject_resample(input_path, output_path, dst_crs='EPSG:3857', resolution=
             'height': height
         })
 
-        with rasterio.open(output_path, 'w', **kwargs) as dst:
+        with open_cog(output_path, kwargs) as dst:
             for i in range(1, src.count + 1):
                 reproject(
                     source=rasterio.band(src, i),
@@ -32,62 +47,107 @@ def reproject_resample(input_path, output_path, dst_crs='EPSG:3857', resolution=
                     dst_crs=dst_crs,
                     resampling=ResamplingEnums.bilinear)
 
-def calculate_ndvi(red_path, nir_path, output_path):
+        count(pixels=width * height * src.count)
+    count(path=output_path)
+
+@timed("reproject")
+def reproject_to_tile(input_path, output_path, tile_id, resolution=10):
+    """
+    Reproject a raster onto a fixed tile of the national grid.
+    Pixels outside the source footprint are written as nodata.
+    """
+    with open_raster(input_path) as src:
+        transform, width, height = tile_grid(tile_id, resolution)
+        nodata = src.nodata if src.nodata is not None else 0
+
+        kwargs = src.meta.copy()
+        kwargs.update({
+            'crs': GRID_CRS,
+            'transform': transform,
+            'width': width,
+            'height': height,
+            'nodata': nodata
+        })
+
+        with open_cog(output_path, kwargs) as dst:
+            for i in range(1, src.count + 1):
+                reproject(
+                    source=rasterio.band(src, i),
+                    destination=rasterio.band(dst, i),
+                    src_transform=src.transform,
+                    src_crs=src.crs,
+                    dst_transform=transform,
+                    dst_crs=GRID_CRS,
+                    dst_nodata=nodata,
+                    resampling=ResamplingEnums.bilinear)
+
+        count(pixels=width * height * src.count)
+    count(path=output_path)
+
+@timed("ndvi")
+def calculate_ndvi(red_path, nir_path, output_path, block_size=BLOCK_SIZE):
     """
     Calculate NDVI from Red and NIR bands.
     """
-    with rasterio.open(red_path) as red_src, rasterio.open(nir_path) as nir_src:
-        red = red_src.read(1).astype(float)
-        nir = nir_src.read(1).astype(float)
-        
-        # Avoid division by zero
-        ndvi = (nir - red) / (nir + red + 1e-10)
-        
+    with open_raster(red_path) as red_src, open_raster(nir_path) as nir_src:
         meta = red_src.meta.copy()
         meta.update(dtype=rasterio.float32, count=1)
-        
-        with rasterio.open(output_path, 'w', **meta) as dst:
-            dst.write(ndvi.astype(rasterio.float32), 1)
 
+        with open_cog(output_path, meta) as dst:
+            for window in _windows(red_src.width, red_src.height, block_size):
+                red = red_src.read(1, window=window).astype(np.float32)
+                nir = nir_src.read(1, window=window).astype(np.float32)
+                # Avoid division by zero
+                dst.write((nir - red) / (nir + red + 1e-10), 1, window=window)
+
+        pixels = red_src.width * red_src.height
+    count(pixels=pixels, path=output_path)
+
+@timed("speckle")
 def filter_speckle(input_path, output_path, size=3):
     """
     Apply a simple median filter for speckle reduction in SAR data.
     """
-    with rasterio.open(input_path) as src:
+    from scipy.ndimage import median_filter
+
+    with open_raster(input_path) as src:
         data = src.read(1)
         filtered = median_filter(data, size=size)
         
         meta = src.meta.copy()
-        with rasterio.open(output_path, 'w', **meta) as dst:
-            dst.write(filtered, 1)
+        write_cog(output_path, filtered, meta)
 
-def create_median_composite(scene_paths, output_path):
+    count(pixels=data.size, path=output_path)
+
+@timed("composite")
+def create_median_composite(scene_paths, output_path, block_size=BLOCK_SIZE):
     """
     Create a median composite from a list of scene paths (same band).
     Assumes all inputs are already reprojected/aligned.
     """
     if not scene_paths:
         return
-    
-    # Read first to get meta
-    with rasterio.open(scene_paths[0]) as src:
-        meta = src.meta.copy()
-        shape = src.shape
-        
-    stack = np.zeros((len(scene_paths), shape[0], shape[1]), dtype=rasterio.float32)
-    
-    for idx, path in enumerate(scene_paths):
-        with rasterio.open(path) as src:
-            # Handle different sizes if alignment isn't perfect (crop/pad) - simplified here
-            data = src.read(1)
-            if data.shape == shape:
-                stack[idx] = data
-            else:
-                # In real world, use reproject/warp to match reference
-                pass 
-
-    # Calculate median ignoring NaNs/NoData
-    composite = np.nanmedian(stack, axis=0)
-    
-    with rasterio.open(output_path, 'w', **meta) as dst:
-        dst.write(composite.astype(meta['dtype']), 1)
+
+    with ExitStack() as stack:
+        sources = [stack.enter_context(open_raster(path)) for path in scene_paths]
+        meta = sources[0].meta.copy()
+        shape = sources[0].shape
+        if meta.get('nodata') is None:
+            meta['nodata'] = 0
+        # Handle different sizes if alignment isn't perfect (crop/pad) - simplified here:
+        # in real world, use reproject/warp to match reference, they are skipped instead
+        sources = [src for src in sources if src.shape == shape]
+        dst = stack.enter_context(open_cog(output_path, meta, count=1))
+
+        for window in _windows(shape[1], shape[0], block_size):
+            # NoData (e.g. tile area outside a scene footprint) is skipped by nanmedian
+            block = np.stack([src.read(1, window=window, masked=True).astype(np.float32).filled(np.nan)
+                              for src in sources])
+            # Median only where some scene has data: all-NaN pixels (common on
+            # border tiles) take nanmedian's slow path
+            covered = np.isfinite(block).any(axis=0)
+            composite = np.full(covered.shape, meta['nodata'], dtype=np.float32)
+            composite[covered] = np.nanmedian(block[:, covered], axis=0)
+            dst.write(composite.astype(dst.dtypes[0], copy=False), 1, window=window)
+
+    count(pixels=len(scene_paths) * shape[0] * shape[1], path=output_path)
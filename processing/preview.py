@@ -0,0 +1,177 @@
+import os
+import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from affine import Affine
+from rasterio.enums import Resampling
+from rasterio.errors import WindowError
+from rasterio.warp import reproject, transform_bounds
+from rasterio.windows import Window, from_bounds
+from tiling import GRID_CRS, DEFAULT_AOI, tile_bounds, tile_grid, tiles_for_aoi, mosaic_tiles
+from metrics import MetricsRecorder, get_recorder, use_recorder, timed, count
+from raster_writer import write_cog
+from remote_cache import open_raster
+from pipeline import DATA_DIR, find_scenes, scene_band_path
+from db import dispose_engine
+
+# Quick-look mode: composite, NDVI and baseline change for a month at a coarse
+# resolution (e.g. 80 or 160 m). Sources are read through decimated windowed
+# reads, which GDAL serves from overviews, so a national preview touches a small
+# fraction of the bytes of a full run. Outputs live under DATA_DIR/previews,
+# carry a "preview" GeoTIFF tag and are never registered in the database.
+
+PREVIEW_DIR = os.path.join(DATA_DIR, "previews")
+DEFAULT_RESOLUTION = 160
+
+logger = logging.getLogger(__name__)
+
+def preview_dir(year, month, resolution):
+    return os.path.join(PREVIEW_DIR, f"{resolution}m", str(year), str(month))
+
+def preview_tags(resolution, **extra):
+    return {"preview": "true", "resolution_m": str(resolution), **extra}
+
+def previous_month(year, month):
+    return (year - 1, 12) if month == 1 else (year, month - 1)
+
+def read_decimated(input_path, tile_id, resolution):
+    """
+    Read band 1 of a source onto a tile's grid at the given resolution.
+    Only the window under the tile is read, already downsampled with average
+    resampling. Returns float32 with NaN as nodata, or None if the source
+    does not cover the tile.
+    """
+    transform, width, height = tile_grid(tile_id, resolution)
+    with open_raster(input_path) as src:
+        footprint = from_bounds(*transform_bounds(GRID_CRS, src.crs, *tile_bounds(tile_id)), transform=src.transform)
+        try:
+            window = footprint.intersection(Window(0, 0, src.width, src.height))
+        except WindowError:
+            return None
+        window = window.round_offsets().round_lengths()
+        if window.width < 1 or window.height < 1:
+            return None
+
+        # Source pixels per preview pixel, so the read lands close to the target resolution
+        factor = max(footprint.width / width, footprint.height / height, 1.0)
+        out_shape = (max(1, int(round(window.height / factor))), max(1, int(round(window.width / factor))))
+        data = src.read(1, window=window, out_shape=out_shape, resampling=Resampling.average, masked=True)
+        src_transform = src.window_transform(window) * Affine.scale(window.width / out_shape[1],
+                                                                    window.height / out_shape[0])
+        src_crs = src.crs
+
+    source = data.astype(np.float32).filled(np.nan)
+    preview = np.full((height, width), np.nan, dtype=np.float32)
+    reproject(source, preview, src_transform=src_transform, src_crs=src_crs, src_nodata=np.nan,
+              dst_transform=transform, dst_crs=GRID_CRS, dst_nodata=np.nan, resampling=Resampling.average)
+    count(pixels=source.size)
+    return preview
+
+@timed("preview")
+def preview_tile(band_paths, tile_id, resolution, output_dir):
+    """
+    Median composites and NDVI of one tile at preview resolution from
+    {band: [scene paths]}. Returns the NDVI path, or None if a band has no
+    source covering the tile.
+    """
+    transform, width, height = tile_grid(tile_id, resolution)
+    meta = {"driver": "GTiff", "crs": GRID_CRS, "transform": transform, "width": width, "height": height,
+            "count": 1, "dtype": "float32", "nodata": np.nan}
+    os.makedirs(output_dir, exist_ok=True)
+
+    composites = {}
+    for band in ("red", "nir"):
+        layers = [layer for layer in (read_decimated(p, tile_id, resolution) for p in band_paths.get(band, []))
+                  if layer is not None]
+        if not layers:
+            return None
+        # Median only where some scene has data; most of a border tile is empty
+        stack = np.stack(layers)
+        covered = np.isfinite(stack).any(axis=0)
+        composites[band] = np.full(covered.shape, np.nan, dtype=np.float32)
+        composites[band][covered] = np.nanmedian(stack[:, covered], axis=0)
+        write_cog(os.path.join(output_dir, f"{band}_composite.tif"), composites[band], meta,
+                  tags=preview_tags(resolution, tile_id=tile_id, product=f"{band}_composite"))
+
+    red, nir = composites["red"], composites["nir"]
+    ndvi = (nir - red) / (nir + red + 1e-10)
+    ndvi_path = os.path.join(output_dir, "ndvi.tif")
+    write_cog(ndvi_path, ndvi, meta, tags=preview_tags(resolution, tile_id=tile_id, product="ndvi"))
+    return ndvi_path
+
+def run_tile_preview(year, month, tile_id, sensor="Sentinel-2", resolution=DEFAULT_RESOLUTION, overwrite=False):
+    """
+    Preview composite and NDVI of one tile for a month. Returns the NDVI path or None.
+    """
+    output_dir = os.path.join(preview_dir(year, month, resolution), tile_id)
+    ndvi_path = os.path.join(output_dir, "ndvi.tif")
+    if os.path.exists(ndvi_path) and not overwrite:
+        return ndvi_path
+
+    scenes = find_scenes(year, month, tile_id, sensor)
+    band_paths = {band: [p for p in (scene_band_path(s, band) for s in scenes) if p] for band in ("red", "nir")}
+    return preview_tile(band_paths, tile_id, resolution, output_dir)
+
+def preview_change(baseline_ndvi, target_ndvi, output_path, resolution, threshold=0.2):
+    from baseline import detect_change_blockwise
+
+    detect_change_blockwise([baseline_ndvi, target_ndvi], output_path, threshold=threshold, num_threads=1,
+                            tags=preview_tags(resolution, product="change"))
+    return output_path
+
+def _run_tile(year, month, tile_id, sensor, resolution, baseline, overwrite):
+    # Worker entry point, as in pipeline._run_tile
+    recorder = MetricsRecorder()
+    with use_recorder(recorder):
+        ndvi = run_tile_preview(year, month, tile_id, sensor, resolution, overwrite)
+        baseline_ndvi = run_tile_preview(*baseline, tile_id, sensor, resolution, overwrite) if ndvi else None
+        change = None
+        if baseline_ndvi:
+            change = os.path.join(os.path.dirname(ndvi), f"change_from_{baseline[0]}-{baseline[1]:02d}.tif")
+            preview_change(baseline_ndvi, ndvi, change, resolution)
+    return (ndvi, change), recorder.snapshot()
+
+def run_monthly_preview(year, month, sensor="Sentinel-2", aoi=DEFAULT_AOI, resolution=DEFAULT_RESOLUTION,
+                        baseline=None, max_workers=None, overwrite=False):
+    """
+    Quick-look composite, NDVI and change (against baseline, default the
+    previous month) over the AOI at preview resolution, mosaicked into
+    single COGs. Returns {"ndvi", "change", "failed"}.
+    """
+    baseline = baseline or previous_month(year, month)
+    tiles = tiles_for_aoi(aoi)
+    logger.info(f"Previewing {len(tiles)} tiles for {year}-{month} at {resolution} m")
+
+    recorder = get_recorder()
+    recorder.set_progress(0, len(tiles))
+    ndvi_paths, change_paths, failed = [], [], []
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=dispose_engine) as executor:
+        futures = {
+            executor.submit(_run_tile, year, month, tile_id, sensor, resolution, baseline, overwrite): tile_id
+            for tile_id in tiles
+        }
+        for i, future in enumerate(as_completed(futures), 1):
+            tile_id = futures[future]
+            try:
+                (ndvi, change), snapshot = future.result()
+            except Exception as e:
+                logger.error(f"Preview of tile {tile_id} failed: {e}")
+                failed.append(tile_id)
+            else:
+                recorder.merge(snapshot)
+                ndvi_paths += [ndvi] if ndvi else []
+                change_paths += [change] if change else []
+            recorder.set_progress(i, len(tiles))
+
+    output_dir = preview_dir(year, month, resolution)
+    os.makedirs(output_dir, exist_ok=True)
+    baseline_name = f"{baseline[0]}-{baseline[1]:02d}"
+    tags = preview_tags(resolution, baseline=baseline_name)
+    result = {
+        "ndvi": mosaic_tiles(ndvi_paths, os.path.join(output_dir, "ndvi.tif"), tags=dict(tags, product="ndvi")),
+        "change": mosaic_tiles(change_paths, os.path.join(output_dir, f"change_from_{baseline_name}.tif"),
+                               tags=dict(tags, product="change")),
+        "failed": failed,
+    }
+    logger.info(f"Preview for {year}-{month}: {len(ndvi_paths)} tiles, {len(change_paths)} with change")
+    return result
@@ -0,0 +1,79 @@
+import os
+from contextlib import contextmanager
+import numpy as np
+import rasterio
+from rasterio.shutil import copy as raster_copy
+
+# Shared writer for every raster the pipeline produces.
+# Outputs are Cloud-Optimized GeoTIFFs: tiled, compressed with a predictor and
+# with internal overviews, so windowed reads, tile rendering and uploads only
+# touch the bytes they need.
+
+COMPRESS = os.getenv("RASTER_COMPRESS", "deflate")  # deflate or zstd
+BLOCKSIZE = int(os.getenv("RASTER_BLOCKSIZE", "512"))
+
+def predictor_for(dtype):
+    """
+    Horizontal differencing for multi-byte integers, floating point predictor for
+    floats, none for uint8 class maps (where it does not help).
+    """
+    dtype = np.dtype(dtype)
+    if dtype.kind == 'f':
+        return "FLOATING_POINT"
+    if dtype.itemsize > 1:
+        return "STANDARD"
+    return "NO"
+
+def overview_resampling_for(dtype):
+    # Class maps must not be averaged into non-existent classes
+    return "nearest" if np.dtype(dtype) == np.uint8 else "average"
+
+def _staging_profile(meta):
+    profile = dict(meta)
+    for key in ("compress", "predictor", "interleave"):
+        profile.pop(key, None)
+    profile.update(driver="GTiff", tiled=True, blockxsize=BLOCKSIZE, blockysize=BLOCKSIZE, BIGTIFF="IF_SAFER")
+    return profile
+
+def _finalize(staging_path, output_path, dtype, compress=None, resampling=None):
+    tmp_path = f"{output_path}.cog.tmp"
+    raster_copy(
+        staging_path, tmp_path, driver="COG",
+        compress=(compress or COMPRESS).upper(),
+        predictor=predictor_for(dtype),
+        blocksize=BLOCKSIZE,
+        overview_resampling=resampling or overview_resampling_for(dtype),
+        bigtiff="IF_SAFER",
+        num_threads="ALL_CPUS")
+    os.replace(tmp_path, output_path)
+
+@contextmanager
+def open_cog(output_path, meta, compress=None, resampling=None, tags=None, **updates):
+    """
+    Open a raster for writing and turn it into a COG when the block exits.
+
+    The yielded dataset is an uncompressed tiled GeoTIFF, so producers can
+    write it whole or block by block (dst.write(data, window=...)) or
+    reproject into it; overviews and compression are applied once at the end.
+    tags are stored as GeoTIFF metadata.
+    """
+    profile = _staging_profile(dict(meta, **updates))
+    staging_path = f"{output_path}.staging.tif"
+    try:
+        with rasterio.open(staging_path, 'w', **profile) as dst:
+            if tags:
+                dst.update_tags(**tags)
+            yield dst
+        _finalize(staging_path, output_path, profile['dtype'], compress, resampling)
+    finally:
+        if os.path.exists(staging_path):
+            os.remove(staging_path)
+
+def write_cog(output_path, data, meta, compress=None, resampling=None, tags=None, **updates):
+    """
+    Write a (rows, cols) or (bands, rows, cols) array as a COG.
+    """
+    data = data if data.ndim == 3 else data[np.newaxis]
+    updates.setdefault('count', data.shape[0])
+    with open_cog(output_path, meta, compress=compress, resampling=resampling, tags=tags, **updates) as dst:
+        dst.write(data.astype(dst.dtypes[0], copy=False))
@@ -0,0 +1,319 @@
+import fcntl
+import hashlib
+import io
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+import requests
+
+# Read-through cache for remote rasters and objects (Supabase buckets, STAC COG hrefs).
+# Fetched byte ranges and whole objects are stored as files on local disk and
+# indexed in SQLite; total size is bounded with LRU or LFU eviction. Data files
+# are written atomically (temp file + rename) and eviction runs under an
+# exclusive file lock, so several processes can share one cache directory.
+
+CACHE_DIR = os.getenv("RASTER_CACHE_DIR", os.path.join(os.getenv("DATA_DIR", "data"), "cache"))
+CACHE_MAX_BYTES = int(os.getenv("RASTER_CACHE_MAX_BYTES", str(10 * 1024 ** 3)))
+BLOCK_SIZE = 512 * 1024
+EVICT_GRACE = 30  # seconds; recently used entries are not evicted
+META_TTL = float(os.getenv("RASTER_CACHE_META_TTL", "60"))  # seconds before an object's ETag is rechecked
+MISSING_TTL = 300  # seconds; absent sidecar files GDAL probes for on every open
+SIDECAR_SUFFIXES = (".ovr", ".aux.xml", ".aux", ".msk", ".tfw", ".prj", ".imd", ".rpb")
+
+class ByteCache:
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES, policy="lru", meta_ttl=META_TTL):
+        if policy not in ("lru", "lfu"):
+            raise ValueError(f"Unknown eviction policy: {policy}")
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.meta_ttl = meta_ttl
+        self._local = threading.local()
+        os.makedirs(os.path.join(cache_dir, "objects"), exist_ok=True)
+        with self._db() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS entries ("
+                       "key TEXT PRIMARY KEY, path TEXT, size INTEGER, last_access REAL, hits INTEGER)")
+            db.execute("CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER)")
+
+    def _db(self):
+        # One connection per thread; SQLite handles cross-process locking
+        if not hasattr(self._local, "db"):
+            db = sqlite3.connect(os.path.join(self.cache_dir, "index.db"), timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            self._local.db = db
+        return self._local.db
+
+    def _path(self, key):
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        return os.path.join(self.cache_dir, "objects", digest[:2], digest)
+
+    def _bump(self, **counters):
+        with self._db() as db:
+            for name, value in counters.items():
+                db.execute("INSERT INTO stats (name, value) VALUES (?, ?) "
+                           "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value", (name, value))
+
+    def _touch(self, key):
+        with self._db() as db:
+            db.execute("UPDATE entries SET last_access = ?, hits = hits + 1 WHERE key = ?", (time.time(), key))
+
+    def lookup(self, key):
+        """
+        Local path of a cached entry, or None.
+        """
+        row = self._db().execute("SELECT path FROM entries WHERE key = ?", (key,)).fetchone()
+        if row and os.path.exists(row[0]):
+            self._touch(key)
+            return row[0]
+        return None
+
+    def get(self, key):
+        path = self.lookup(key)
+        if path is None:
+            return None
+        try:
+            with open(path, 'rb') as f:
+                return f.read()
+        except FileNotFoundError: # Evicted by another process in between
+            return None
+
+    def put(self, key, data=None, src_path=None):
+        """
+        Store bytes (data) or move a downloaded file (src_path) into the cache.
+        """
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if src_path is not None:
+            os.replace(src_path, path)
+        else:
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        size = os.path.getsize(path)
+        with self._db() as db:
+            db.execute("INSERT OR REPLACE INTO entries (key, path, size, last_access, hits) VALUES (?, ?, ?, ?, 0)",
+                       (key, path, size, time.time()))
+        self._evict()
+        return path
+
+    def get_or_fetch(self, key, fetch):
+        """
+        Cached bytes for key, calling fetch() and storing its result on a miss.
+        """
+        data = self.get(key)
+        if data is not None:
+            self._bump(hits=1, bytes_saved=len(data))
+            return data
+        data = fetch()
+        self._bump(misses=1, bytes_fetched=len(data))
+        self.put(key, data)
+        return data
+
+    def _evict(self):
+        with self._db() as db:
+            total = db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        order = "last_access" if self.policy == "lru" else "hits, last_access"
+        with open(os.path.join(self.cache_dir, ".lock"), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            db = self._db()
+            total = db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            rows = db.execute(f"SELECT key, path, size FROM entries WHERE last_access < ? ORDER BY {order}",
+                              (time.time() - EVICT_GRACE,)).fetchall()
+            evicted = []
+            for key, path, size in rows:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                evicted.append((key,))
+                total -= size
+            with db:
+                db.executemany("DELETE FROM entries WHERE key = ?", evicted)
+            if evicted:
+                self._bump(evictions=len(evicted))
+
+    def stats(self):
+        db = self._db()
+        # hits/misses count data (blocks and objects); meta_* the HEAD lookups behind them
+        stats = {"hits": 0, "misses": 0, "meta_hits": 0, "meta_misses": 0,
+                 "bytes_saved": 0, "bytes_fetched": 0, "evictions": 0}
+        stats.update(dict(db.execute("SELECT name, value FROM stats").fetchall()))
+        stats["entries"], stats["bytes"] = db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return stats
+
+    def open(self, url, mode="rb"):
+        """
+        File-like access to a remote object through the cache; usable as a
+        rasterio opener: rasterio.open(url, opener=cache.open).
+        """
+        if "w" in mode or "+" in mode:
+            raise ValueError("Remote cache is read-only")
+        if not is_remote(url):
+            return open(url, mode)
+        return CachedRangeFile(url, self)
+
+def _remote_version(url):
+    # Size and ETag/Last-Modified, or None if the object does not exist. Any
+    # other error (e.g. 403 from an expired signed URL) raises and is not cached.
+    response = requests.head(url, allow_redirects=True, timeout=30)
+    if response.status_code == 404:
+        return None
+    response.raise_for_status()
+    headers = response.headers
+    version = headers.get("ETag") or headers.get("Last-Modified") or ""
+    return f"{headers['Content-Length']}|{version}"
+
+def remote_version(url, cache):
+    """
+    (size, version) of a remote object. Block keys include the version, so a
+    changed object never serves stale blocks; the answer is reused for
+    cache.meta_ttl seconds and then revalidated with a HEAD request. Missing
+    sidecar files (which GDAL probes for on open) are remembered for
+    MISSING_TTL; any other missing object raises FileNotFoundError uncached.
+    """
+    key = f"head|{url}"
+    cached = cache.get(key)
+    if cached is not None:
+        checked_at, value = cached.decode().split("|", 1)
+        ttl = MISSING_TTL if value == "missing" else cache.meta_ttl
+        if time.time() - float(checked_at) < ttl:
+            cache._bump(meta_hits=1)
+            if value == "missing":
+                raise FileNotFoundError(url)
+            size, version = value.split("|", 1)
+            return int(size), version
+
+    value = _remote_version(url)
+    cache._bump(meta_misses=1)
+    if value is None:
+        if url.lower().endswith(SIDECAR_SUFFIXES):
+            cache.put(key, f"{time.time()}|missing".encode())
+        raise FileNotFoundError(url)
+    cache.put(key, f"{time.time()}|{value}".encode())
+    size, version = value.split("|", 1)
+    return int(size), version
+
+def _fetch_range(url, start, end):
+    response = requests.get(url, headers={"Range": f"bytes={start}-{end - 1}"}, timeout=60)
+    response.raise_for_status()
+    if response.status_code != 206 and start > 0:
+        raise IOError(f"Server ignored range request for {url}")
+    return response.content[:end - start]
+
+class CachedRangeFile(io.RawIOBase):
+    """
+    Seekable read-only view of a remote object, fetched in aligned blocks
+    through a ByteCache. A few recent blocks are also kept in memory since
+    GDAL re-reads headers in small pieces.
+    """
+    def __init__(self, url, cache, block_size=BLOCK_SIZE, memory_blocks=8):
+        super().__init__()
+        self.url = url
+        self.cache = cache
+        self.block_size = block_size
+        self.memory_blocks = memory_blocks
+        self._recent = OrderedDict()
+        self.size, self.version = remote_version(url, cache)
+        self.pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self.pos = offset
+        elif whence == io.SEEK_CUR:
+            self.pos += offset
+        elif whence == io.SEEK_END:
+            self.pos = self.size + offset
+        return self.pos
+
+    def _block(self, index):
+        block = self._recent.get(index)
+        if block is not None:
+            self._recent.move_to_end(index)
+            return block
+        start = index * self.block_size
+        end = min(start + self.block_size, self.size)
+        key = f"{self.url}|{self.version}|{self.block_size}|{index}"
+        block = self.cache.get_or_fetch(key, lambda: _fetch_range(self.url, start, end))
+        self._recent[index] = block
+        if len(self._recent) > self.memory_blocks:
+            self._recent.popitem(last=False)
+        return block
+
+    def read(self, size=-1):
+        end = self.size if size is None or size < 0 else min(self.pos + size, self.size)
+        if self.pos >= end:
+            return b""
+        chunks = []
+        for index in range(self.pos // self.block_size, (end - 1) // self.block_size + 1):
+            block = self._block(index)
+            block_start = index * self.block_size
+            chunks.append(block[max(self.pos - block_start, 0):end - block_start])
+        data = b"".join(chunks)
+        self.pos = end
+        return data
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+_default_cache = None
+
+def default_cache():
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ByteCache()
+    return _default_cache
+
+def is_remote(path):
+    return str(path).startswith(("http://", "https://"))
+
+def open_raster(path, cache=None, **kwargs):
+    """
+    rasterio.open for local paths and remote URLs; remote reads go through the cache.
+    """
+    import rasterio
+
+    if not is_remote(path):
+        return rasterio.open(path, **kwargs)
+    return rasterio.open(path, opener=(cache or default_cache()).open, **kwargs)
+
+def cached_object(url, cache=None):
+    """
+    Local path of a whole remote object, downloading it into the cache on a miss.
+    Keyed by remote_version like CachedRangeFile blocks, so a replaced object
+    is downloaded again once its version has been revalidated.
+    """
+    cache = cache or default_cache()
+    _, version = remote_version(url, cache)
+    key = f"object|{url}|{version}"
+    path = cache.lookup(key)
+    if path:
+        cache._bump(hits=1, bytes_saved=os.path.getsize(path))
+        return path
+
+    fd, tmp_path = tempfile.mkstemp(dir=cache.cache_dir, suffix=".download")
+    with os.fdopen(fd, 'wb') as f, requests.get(url, stream=True, timeout=60) as response:
+        response.raise_for_status()
+        for chunk in response.iter_content(chunk_size=1024 * 1024):
+            f.write(chunk)
+    cache._bump(misses=1, bytes_fetched=os.path.getsize(tmp_path))
+    return cache.put(key, src_path=tmp_path)
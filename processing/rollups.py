@@ -0,0 +1,84 @@
+import logging
+from sqlalchemy import text
+from models import Composite, ChangeDetection
+from metrics import timed
+
+# Change-statistics rollups for the dashboard.
+# change_stats holds area and polygon count per (month, sensor, admin boundary,
+# change type). It is rebuilt only for the months touched by a run, with one
+# DELETE + INSERT ... SELECT per month inside a single transaction, so readers
+# never see a half-refreshed month.
+
+logger = logging.getLogger(__name__)
+
+DELETE_MONTH = text("DELETE FROM change_stats WHERE month = :month AND sensor = :sensor")
+
+# Polygons fully inside a boundary skip the (expensive) intersection; areas are
+# geodesic so they are comparable across the country.
+INSERT_MONTH = text("""
+    INSERT INTO change_stats (month, sensor, admin_id, change_type, area_ha, count, updated_at)
+    SELECT :month, :sensor, a.id, c.change_type,
+           SUM(ST_Area(CASE WHEN ST_CoveredBy(c.geometry, a.geometry) THEN c.geometry
+                            ELSE ST_Intersection(c.geometry, a.geometry) END::geography)) / 10000.0,
+           COUNT(*),
+           timezone('utc', now())
+    FROM changes c
+    JOIN composites comp ON comp.id = c.target_composite_id
+    JOIN admin_boundaries a ON ST_Intersects(c.geometry, a.geometry)
+    WHERE comp.start_date >= :month AND comp.start_date < (:month + interval '1 month')
+      AND comp.sensor = :sensor
+    GROUP BY a.id, c.change_type
+""")
+
+ASSIGN_PARENTS = text("""
+    UPDATE admin_boundaries child SET parent_id = parent.id
+    FROM admin_boundaries parent
+    WHERE child.level = :level AND parent.level = :level - 1
+      AND ST_Contains(parent.geometry, ST_PointOnSurface(child.geometry))
+""")
+
+def months_for_composites(db, composite_ids=None):
+    """
+    (first day of month, sensor) pairs covered by the given target composites,
+    or by every composite referenced from changes when composite_ids is None.
+    """
+    query = db.query(Composite.start_date, Composite.sensor)
+    if composite_ids is None:
+        query = query.filter(Composite.id.in_(db.query(ChangeDetection.target_composite_id).distinct()))
+    else:
+        query = query.filter(Composite.id.in_(list(composite_ids)))
+    return sorted({(start.replace(day=1), sensor) for start, sensor in query.all() if start})
+
+@timed("rollup")
+def refresh_change_stats(db, composite_ids=None):
+    """
+    Recompute change_stats for the months of the given target composites
+    (all months when None). Returns the number of rows written.
+    """
+    written = 0
+    for month, sensor in months_for_composites(db, composite_ids):
+        params = {"month": month, "sensor": sensor}
+        db.execute(DELETE_MONTH, params)
+        written += db.execute(INSERT_MONTH, params).rowcount
+    db.commit()
+    logger.info(f"Refreshed change statistics: {written} rows")
+    return written
+
+def load_admin_boundaries(db, path, level, name_field="name"):
+    """
+    Append boundaries of one admin level from any file geopandas reads and
+    link them to the enclosing boundaries of the level above.
+    """
+    import geopandas as gpd
+    from shapely.geometry import MultiPolygon
+
+    gdf = gpd.read_file(path).to_crs(epsg=4326)
+    gdf = gdf.rename(columns={name_field: "name"})[["name", "geometry"]]
+    gdf["geometry"] = [MultiPolygon([g]) if g.geom_type == "Polygon" else g for g in gdf.geometry]
+    gdf["level"] = level
+    gdf.to_postgis("admin_boundaries", db.get_bind(), if_exists="append", index=False)
+    if level > 0:
+        db.execute(ASSIGN_PARENTS, {"level": level})
+        db.commit()
+    logger.info(f"Loaded {len(gdf)} level-{level} boundaries from {path}")
+    return len(gdf)
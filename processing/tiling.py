@@ -0,0 +1,129 @@
+import math
+import os
+from rasterio.transform import from_origin
+from rasterio.warp import transform_bounds
+
+# Fixed national tiling grid.
+# Tiles are square cells of an equal-area CRS (EASE-Grid 2.0 global, EPSG:6933)
+# anchored at the upper-left corner of the projection, so every run, sensor and
+# month lands on the same tile boundaries and outputs can be cached per tile.
+GRID_NAME = "EA100K"
+GRID_CRS = "EPSG:6933"
+TILE_SIZE = 100000  # metres
+GRID_ORIGIN = (-17367530.45, 7314540.83)  # (x_min, y_max) of EPSG:6933
+
+# Default area of interest: Rwanda approx bbox (lon/lat)
+DEFAULT_AOI = (28.8, -2.9, 30.9, -1.0)
+
+
+def tile_id(col, row):
+    """
+    Build the tile name for a grid column/row.
+    """
+    return f"{GRID_NAME}-{col:04d}-{row:04d}"
+
+
+def parse_tile_id(tid):
+    """
+    Return (col, row) for a tile name.
+    """
+    grid, col, row = tid.split("-")
+    if grid != GRID_NAME:
+        raise ValueError(f"Tile {tid} does not belong to grid {GRID_NAME}")
+    return int(col), int(row)
+
+
+def tile_bounds(tid):
+    """
+    Bounds (left, bottom, right, top) of a tile in the grid CRS.
+    """
+    col, row = parse_tile_id(tid)
+    left = GRID_ORIGIN[0] + col * TILE_SIZE
+    top = GRID_ORIGIN[1] - row * TILE_SIZE
+    return left, top - TILE_SIZE, left + TILE_SIZE, top
+
+
+def tile_bounds_lonlat(tid):
+    """
+    Bounds of a tile in EPSG:4326, e.g. for STAC searches.
+    """
+    return transform_bounds(GRID_CRS, "EPSG:4326", *tile_bounds(tid))
+
+
+def check_resolution(resolution):
+    """
+    Pixels per tile side at a resolution, which must divide TILE_SIZE:
+    otherwise the last partial pixel would be cut, leaving gaps between tiles.
+    """
+    if resolution <= 0 or TILE_SIZE % resolution:
+        raise ValueError(f"Resolution {resolution} m does not divide the {TILE_SIZE} m tile size")
+    return int(TILE_SIZE // resolution)
+
+
+def tile_grid(tid, resolution=10):
+    """
+    Target transform, width and height for rasters written on a tile.
+    """
+    left, bottom, right, top = tile_bounds(tid)
+    size = check_resolution(resolution)
+    return from_origin(left, top, resolution, resolution), size, size
+
+
+def tiles_for_aoi(bbox, crs="EPSG:4326"):
+    """
+    List the tiles touched by an AOI bbox (left, bottom, right, top).
+    """
+    left, bottom, right, top = transform_bounds(crs, GRID_CRS, *bbox)
+    col_min = int(math.floor((left - GRID_ORIGIN[0]) / TILE_SIZE))
+    col_max = int(math.ceil((right - GRID_ORIGIN[0]) / TILE_SIZE)) - 1
+    row_min = int(math.floor((GRID_ORIGIN[1] - top) / TILE_SIZE))
+    row_max = int(math.ceil((GRID_ORIGIN[1] - bottom) / TILE_SIZE)) - 1
+    return [
+        tile_id(col, row)
+        for row in range(row_min, row_max + 1)
+        for col in range(col_min, col_max + 1)
+    ]
+
+
+def tile_path(root, tid, name):
+    """
+    Standard location of a per-tile output: <root>/<tile_id>/<name>.
+    """
+    tile_dir = os.path.join(root, tid)
+    os.makedirs(tile_dir, exist_ok=True)
+    return os.path.join(tile_dir, name)
+
+
+def build_vrt(paths, output_path):
+    """
+    Stitch per-tile rasters into a single VRT mosaic (requires gdalbuildvrt).
+    """
+    import subprocess
+
+    paths = [p for p in paths if os.path.exists(p)]
+    if not paths:
+        return None
+    subprocess.run(["gdalbuildvrt", "-q", output_path, *paths], check=True)
+    return output_path
+
+
+def mosaic_tiles(paths, output_path, tags=None):
+    """
+    Merge per-tile rasters into a single GeoTIFF.
+    """
+    import rasterio
+    from rasterio.merge import merge
+    from raster_writer import write_cog
+
+    sources = [rasterio.open(p) for p in paths if os.path.exists(p)]
+    if not sources:
+        return None
+    try:
+        mosaic, transform = merge(sources)
+        meta = sources[0].meta.copy()
+        meta.update(height=mosaic.shape[1], width=mosaic.shape[2], transform=transform)
+        write_cog(output_path, mosaic, meta, tags=tags)
+    finally:
+        for src in sources:
+            src.close()
+    return output_path
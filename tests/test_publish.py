@@ -0,0 +1,128 @@
+import os
+import sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+
+from publish import LocalBackend, Manifest, Publisher, S3Backend, file_sha256
+
+def write(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+    return str(path)
+
+@pytest.fixture
+def publisher(tmp_path):
+    return Publisher(LocalBackend(str(tmp_path / "published")), str(tmp_path / "manifest.json"), retries=1)
+
+def test_unchanged_file_is_skipped(publisher, tmp_path):
+    src = write(tmp_path / "a.tif", b"raster")
+    urls, report = publisher.publish({"2023/a.tif": src})
+    assert report["uploaded"] == ["2023/a.tif"]
+    assert urls["2023/a.tif"].startswith("file://")
+
+    urls, report = publisher.publish({"2023/a.tif": src})
+    assert report == {"uploaded": [], "skipped": ["2023/a.tif"], "failed": {}}
+    assert "2023/a.tif" in urls
+
+def test_changed_file_is_reuploaded(publisher, tmp_path):
+    src = write(tmp_path / "a.tif", b"first")
+    publisher.publish({"a.tif": src})
+    write(src, b"second")
+    _, report = publisher.publish({"a.tif": src})
+    assert report["uploaded"] == ["a.tif"]
+    with open(tmp_path / "published" / "a.tif", "rb") as f:
+        assert f.read() == b"second"
+    assert publisher.manifest.get("a.tif")["sha256"] == file_sha256(src)
+
+def test_deleted_remote_is_reuploaded(publisher, tmp_path):
+    src = write(tmp_path / "a.tif", b"raster")
+    publisher.publish({"a.tif": src})
+    os.remove(tmp_path / "published" / "a.tif")
+    _, report = publisher.publish({"a.tif": src})
+    assert report["uploaded"] == ["a.tif"]
+
+def test_failures_are_reported(publisher, tmp_path):
+    class Failing(LocalBackend):
+        def upload(self, key, file_path, manifest=None, sha256=None):
+            if key == "bad.tif":
+                raise OSError("disk full")
+            super().upload(key, file_path, manifest, sha256)
+
+    publisher.backend = Failing(publisher.backend.root)
+    urls, report = publisher.publish({"good.tif": write(tmp_path / "good.tif", b"ok"),
+                                      "bad.tif": write(tmp_path / "bad.tif", b"nope")})
+    assert report["uploaded"] == ["good.tif"]
+    assert report["failed"] == {"bad.tif": "disk full"}
+    assert set(urls) == {"good.tif"}
+    assert publisher.manifest.get("bad.tif") is None
+
+class StubS3:
+    """
+    Records multipart calls; list_parts reports the parts in `uploaded`.
+    """
+    def __init__(self, uploaded=()):
+        self.uploaded = list(uploaded)
+        self.calls = []
+
+    def create_multipart_upload(self, Bucket, Key):
+        self.calls.append(("create",))
+        return {"UploadId": "new-id"}
+
+    def list_parts(self, Bucket, Key, UploadId):
+        self.calls.append(("list", UploadId))
+        return {"Parts": [{"PartNumber": n, "ETag": f"etag-{n}"} for n in self.uploaded]}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        self.calls.append(("part", UploadId, PartNumber))
+        return {"ETag": f"etag-{PartNumber}"}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        self.calls.append(("complete", UploadId, [p["PartNumber"] for p in MultipartUpload["Parts"]]))
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.calls.append(("abort", UploadId))
+
+def s3_backend(client):
+    backend = S3Backend.__new__(S3Backend)
+    backend.bucket, backend.endpoint_url, backend.public_base_url = "rasters", None, None
+    backend.part_size = 4
+    backend.client = client
+    return backend
+
+def test_multipart_resumes_pending_upload(tmp_path):
+    src = write(tmp_path / "a.tif", b"0123456789ab")  # 3 parts of 4 bytes
+    manifest = Manifest(str(tmp_path / "manifest.json"))
+    sha256 = file_sha256(src)
+    manifest.set_pending("a.tif", {"upload_id": "old-id", "sha256": sha256})
+    client = StubS3(uploaded=[1, 2])
+
+    s3_backend(client).upload("a.tif", src, manifest=manifest, sha256=sha256)
+    assert client.calls == [("list", "old-id"), ("part", "old-id", 3), ("complete", "old-id", [1, 2, 3])]
+
+def test_multipart_aborts_upload_of_changed_file(tmp_path):
+    src = write(tmp_path / "a.tif", b"0123456789ab")
+    manifest = Manifest(str(tmp_path / "manifest.json"))
+    manifest.set_pending("a.tif", {"upload_id": "old-id", "sha256": "stale"})
+    client = StubS3(uploaded=[1, 2])
+
+    s3_backend(client).upload("a.tif", src, manifest=manifest, sha256=file_sha256(src))
+    assert client.calls[:2] == [("abort", "old-id"), ("create",)]
+    assert [c[2] for c in client.calls if c[0] == "part"] == [1, 2, 3]
+    assert client.calls[-1] == ("complete", "new-id", [1, 2, 3])
+    assert manifest.pending("a.tif")["upload_id"] == "new-id"
+
+def test_s3_exists_only_treats_not_found_as_missing():
+    from botocore.exceptions import ClientError
+
+    class Client:
+        def __init__(self, code):
+            self.code = code
+
+        def head_object(self, Bucket, Key):
+            raise ClientError({"Error": {"Code": self.code}}, "HeadObject")
+
+    assert s3_backend(Client("404")).exists("a.tif") is False
+    with pytest.raises(ClientError):
+        s3_backend(Client("403")).exists("a.tif")
@@ -0,0 +1,207 @@
+import hashlib
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "processing"))
+
+import remote_cache
+from remote_cache import ByteCache
+
+# Local HTTP server with HEAD/ETag and Range support standing in for a bucket.
+# OBJECTS maps a path to its bytes, or to an int status code to return instead.
+
+OBJECTS = {}
+REQUESTS = []
+
+class Handler(BaseHTTPRequestHandler):
+    def _object(self):
+        REQUESTS.append((self.command, self.path))
+        body = OBJECTS.get(self.path, 404)
+        if isinstance(body, int):
+            self.send_response(body)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return None
+        return body
+
+    def _headers(self, status, body, length):
+        self.send_response(status)
+        self.send_header("Content-Length", str(length))
+        self.send_header("ETag", f'"{hashlib.md5(body).hexdigest()}"')
+        self.end_headers()
+
+    def do_HEAD(self):
+        body = self._object()
+        if body is not None:
+            self._headers(200, body, len(body))
+
+    def do_GET(self):
+        body = self._object()
+        if body is None:
+            return
+        start, end = 0, len(body) - 1
+        if "Range" in self.headers:
+            start, end = (int(v) for v in self.headers["Range"].split("=")[1].split("-"))
+        chunk = body[start:end + 1]
+        self._headers(206 if "Range" in self.headers else 200, body, len(chunk))
+        self.wfile.write(chunk)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture(scope="module")
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+
+@pytest.fixture(autouse=True)
+def reset():
+    OBJECTS.clear()
+    REQUESTS.clear()
+
+def heads(path):
+    return REQUESTS.count(("HEAD", path))
+
+def gets(path):
+    return REQUESTS.count(("GET", path))
+
+def read_all(cache, url):
+    with cache.open(url) as f:
+        return f.read()
+
+def test_reads_ranges_through_cache(server, tmp_path):
+    url = f"{server}/a.tif"
+    OBJECTS["/a.tif"] = os.urandom(3000)
+    cache = ByteCache(str(tmp_path))
+    with remote_cache.CachedRangeFile(url, cache, block_size=1024) as f:
+        f.seek(100)
+        assert f.read(100) == OBJECTS["/a.tif"][100:200]
+        f.seek(-10, os.SEEK_END)
+        assert f.read() == OBJECTS["/a.tif"][-10:]
+    assert gets("/a.tif") == 2
+
+    with remote_cache.CachedRangeFile(url, cache, block_size=1024) as f:
+        assert f.read() == OBJECTS["/a.tif"]
+    # Blocks 0 and 2 come from disk, only block 1 is fetched
+    assert gets("/a.tif") == 3
+
+def test_changed_object_is_revalidated(server, tmp_path):
+    url = f"{server}/a.tif"
+    OBJECTS["/a.tif"] = b"first version"
+    cache = ByteCache(str(tmp_path), meta_ttl=0)
+    assert read_all(cache, url) == b"first version"
+
+    OBJECTS["/a.tif"] = b"second version"
+    assert read_all(cache, url) == b"second version"
+    assert heads("/a.tif") == 2
+
+def test_version_reused_within_ttl(server, tmp_path):
+    url = f"{server}/a.tif"
+    OBJECTS["/a.tif"] = b"first version"
+    cache = ByteCache(str(tmp_path), meta_ttl=3600)
+    read_all(cache, url)
+    read_all(cache, url)
+    assert heads("/a.tif") == 1
+
+def test_missing_object_is_not_cached(server, tmp_path):
+    url = f"{server}/late.tif"
+    cache = ByteCache(str(tmp_path))
+    with pytest.raises(FileNotFoundError):
+        cache.open(url)
+    OBJECTS["/late.tif"] = b"uploaded"
+    assert read_all(cache, url) == b"uploaded"
+
+def test_forbidden_is_not_cached(server, tmp_path):
+    url = f"{server}/a.tif"
+    OBJECTS["/a.tif"] = 403
+    cache = ByteCache(str(tmp_path))
+    with pytest.raises(requests.HTTPError):
+        cache.open(url)
+    OBJECTS["/a.tif"] = b"readable again"
+    assert read_all(cache, url) == b"readable again"
+
+def test_missing_sidecar_is_cached_with_ttl(server, tmp_path, monkeypatch):
+    url = f"{server}/a.tif.ovr"
+    cache = ByteCache(str(tmp_path))
+    for _ in range(2):
+        with pytest.raises(FileNotFoundError):
+            cache.open(url)
+    assert heads("/a.tif.ovr") == 1
+
+    monkeypatch.setattr(remote_cache, "MISSING_TTL", 0)
+    with pytest.raises(FileNotFoundError):
+        cache.open(url)
+    assert heads("/a.tif.ovr") == 2
+
+@pytest.mark.parametrize("policy", ["lru", "lfu"])
+def test_eviction_bounds_size(tmp_path, monkeypatch, policy):
+    monkeypatch.setattr(remote_cache, "EVICT_GRACE", 0)
+    cache = ByteCache(str(tmp_path), max_bytes=2500, policy=policy)
+    cache.put("a", b"a" * 1000)
+    cache.put("b", b"b" * 1000)
+    assert cache.get("a") is not None  # a is now more recently and more often used than b
+    cache.put("c", b"c" * 1000)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == b"a" * 1000
+    assert cache.get("c") == b"c" * 1000
+    stats = cache.stats()
+    assert stats["bytes"] <= 2500
+    assert stats["evictions"] == 1
+
+def test_recent_entries_survive_eviction(tmp_path):
+    # Entries used within EVICT_GRACE may still be open in another process
+    cache = ByteCache(str(tmp_path), max_bytes=1500)
+    cache.put("a", b"a" * 1000)
+    cache.put("b", b"b" * 1000)
+    assert cache.get("a") is not None
+    assert cache.stats()["evictions"] == 0
+
+def test_open_raster_through_cache(server, tmp_path):
+    import numpy as np
+    import rasterio
+    from rasterio.transform import from_origin
+
+    path = str(tmp_path / "src.tif")
+    data = np.arange(64 * 64, dtype=np.uint16).reshape(64, 64)
+    with rasterio.open(path, "w", driver="GTiff", width=64, height=64, count=1, dtype="uint16",
+                       crs="EPSG:6933", transform=from_origin(0, 0, 10, 10)) as dst:
+        dst.write(data, 1)
+    with open(path, "rb") as f:
+        OBJECTS["/src.tif"] = f.read()
+
+    cache = ByteCache(str(tmp_path / "cache"))
+    with remote_cache.open_raster(f"{server}/src.tif", cache=cache) as src:
+        assert (src.read(1) == data).all()
+
+def test_cached_object_is_revalidated(server, tmp_path):
+    url = f"{server}/a.gpkg"
+    OBJECTS["/a.gpkg"] = b"first version"
+    cache = ByteCache(str(tmp_path), meta_ttl=0)
+    with open(remote_cache.cached_object(url, cache), "rb") as f:
+        assert f.read() == b"first version"
+    remote_cache.cached_object(url, cache)
+    assert gets("/a.gpkg") == 1
+
+    OBJECTS["/a.gpkg"] = b"second version"
+    with open(remote_cache.cached_object(url, cache), "rb") as f:
+        assert f.read() == b"second version"
+    assert gets("/a.gpkg") == 2
+
+def test_head_lookups_counted_separately(server, tmp_path):
+    url = f"{server}/a.tif"
+    OBJECTS["/a.tif"] = b"x" * 100
+    cache = ByteCache(str(tmp_path), meta_ttl=3600)
+    read_all(cache, url)
+    read_all(cache, url)
+    stats = cache.stats()
+    assert (stats["meta_misses"], stats["meta_hits"]) == (1, 1)
+    assert (stats["misses"], stats["hits"]) == (1, 1)